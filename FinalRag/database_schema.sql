@@ -374,4 +374,63 @@ CREATE TRIGGER on_auth_user_created
 -- Update sessions table to use auth user IDs
 -- Note: You might need to adjust this based on your current data
 
+-- Verify session ownership and insert a chat log in one round trip.
+-- Returns the new chat log id, or NULL if the session doesn't belong to the user.
+CREATE OR REPLACE FUNCTION log_chat_if_session_valid(
+    p_session_id UUID,
+    p_user_id TEXT,
+    p_prompt TEXT,
+    p_response TEXT
+)
+RETURNS UUID AS $$
+DECLARE
+    new_id UUID;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM sessions WHERE id = p_session_id AND user_id = p_user_id) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO chat_logs (session_id, prompt, response)
+    VALUES (p_session_id, p_prompt, p_response)
+    RETURNING id INTO new_id;
+
+    RETURN new_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Report which of the given tables exist (used by setup_database.py)
+CREATE OR REPLACE FUNCTION check_tables(names TEXT[])
+RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(table_name::TEXT), '{}')
+    FROM information_schema.tables
+    WHERE table_schema = 'public' AND table_name = ANY(names);
+$$ LANGUAGE sql STABLE;
+
+-- Check ownership and delete a document with its session links in one round trip.
+-- Returns the deleted document's storage path, or NULL if it doesn't exist or belongs to another user.
+CREATE OR REPLACE FUNCTION delete_document_for_user(
+    p_doc_id UUID,
+    p_user_id TEXT
+)
+RETURNS TEXT AS $$
+DECLARE
+    deleted_path TEXT;
+BEGIN
+    -- documents has no owner column - ownership comes from a link to one of the user's sessions,
+    -- so a document without such a link (unlinked, or only in other users' sessions) is never deleted
+    IF NOT EXISTS (
+        SELECT 1 FROM document_sessions ds
+        JOIN sessions s ON s.id = ds.session_id
+        WHERE ds.document_id = p_doc_id AND s.user_id = p_user_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    DELETE FROM document_sessions WHERE document_id = p_doc_id;
+    DELETE FROM documents WHERE id = p_doc_id RETURNING storage_path INTO deleted_path;
+
+    RETURN deleted_path;
+END;
+$$ LANGUAGE plpgsql;
+
 COMMIT;
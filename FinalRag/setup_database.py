@@ -6,12 +6,50 @@ Run this to create tables in Supabase
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+EXPECTED_TABLES = {
+    "sessions": "Sessions",
+    "documents": "Documents",
+    "chat_logs": "Chat logs",
+    "document_sessions": "Document sessions"
+}
+
+# PostgREST error code for an RPC function that doesn't exist
+CHECK_TABLES_MISSING = "PGRST202"
+# Error codes for a table that doesn't exist (PostgREST schema cache miss / Postgres undefined_table)
+TABLE_MISSING = ("PGRST205", "42P01")
+
+def get_existing_tables(supabase: Client) -> set:
+    """Return the expected tables that exist, using one information_schema query when possible"""
+    try:
+        response = supabase.rpc('check_tables', {"names": list(EXPECTED_TABLES)}).execute()
+        return set(response.data or [])
+    except APIError as e:
+        # Only a missing function means "schema not installed yet" - auth and other errors are real failures
+        if e.code != CHECK_TABLES_MISSING:
+            raise
+        # check_tables is created by database_schema.sql - probe each table (concurrently) until it's installed
+        def probe(table_name: str) -> bool:
+            try:
+                supabase.table(table_name).select('*').limit(1).execute()
+                return True
+            except APIError as e:
+                if e.code in TABLE_MISSING:
+                    return False
+                raise
+        
+        # Connection errors from any probe are re-raised when its result is read below
+        with ThreadPoolExecutor(max_workers=len(EXPECTED_TABLES)) as executor:
+            results = list(executor.map(probe, EXPECTED_TABLES))
+        return {table_name for table_name, exists in zip(EXPECTED_TABLES, results) if exists}
+
 def setup_database():
     """Create database tables and storage bucket"""
     
@@ -28,38 +66,24 @@ def setup_database():
         
         print("🚀 Setting up database...")
         
-        # Test connection
-        result = supabase.table('sessions').select('*').limit(1).execute()
+        # Check tables and the storage bucket concurrently - the checks are independent
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tables_future = executor.submit(get_existing_tables, supabase)
+            buckets_future = executor.submit(supabase.storage.list_buckets)
+        
+        # Raises on network/auth failures, so success is only reported after a real round trip
+        existing_tables = tables_future.result()
         print("✅ Database connection successful!")
         
-        # Check if tables exist
-        try:
-            sessions = supabase.table('sessions').select('*').limit(1).execute()
-            print("✅ Sessions table exists")
-        except:
-            print("❌ Sessions table missing")
-            
-        try:
-            documents = supabase.table('documents').select('*').limit(1).execute()
-            print("✅ Documents table exists")
-        except:
-            print("❌ Documents table missing")
-            
-        try:
-            chat_logs = supabase.table('chat_logs').select('*').limit(1).execute()
-            print("✅ Chat logs table exists")
-        except:
-            print("❌ Chat logs table missing")
-            
-        try:
-            document_sessions = supabase.table('document_sessions').select('*').limit(1).execute()
-            print("✅ Document sessions table exists")
-        except:
-            print("❌ Document sessions table missing")
+        for table_name, label in EXPECTED_TABLES.items():
+            if table_name in existing_tables:
+                print(f"✅ {label} table exists")
+            else:
+                print(f"❌ {label} table missing")
         
         # Check storage bucket
         try:
-            buckets = supabase.storage.list_buckets()
+            buckets = buckets_future.result()
             bucket_names = [bucket.name for bucket in buckets]
             if 'documents' in bucket_names:
                 print("✅ Documents storage bucket exists")
@@ -1,93 +1,77 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
-import os
+import asyncio
+import json
+import re
 import uuid
-from datetime import datetime
-import shutil
+from pathlib import Path
+import aiofiles
 
 from src.models.schemas import DocumentStatus
-from src.services.document_service import document_service
+from src.services.document_service import document_service, STATUS_CHANNEL_PREFIX
+from src.db.redis_client import async_redis_client
 from src.services.session_service import session_service
 from src.core.config import settings
+from src.core.responses import ORJSONResponse
+from src.core.clock import iso_now
+from src.core.logger import logger
 from src.services.rag_pipeline.pipeline import rag_pipeline
+from src.services.semantic_cache import semantic_cache
+from src.worker import process_document_background
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
-def process_document_background(file_path: str, user_id: str, doc_id: str, filename: str, upload_date: str, session_id: str):
-    """Background task to process the document"""
-    try:
-        # Update status to processing
-        document_service.update_document_status(doc_id, "processing", "Document is being processed...")
-        
-        # Upload file to Supabase Storage
-        storage_path = f"{user_id}/{session_id}/{doc_id}_{filename}"
-        
-        print(f"Uploading to Supabase Storage: {storage_path}")
-        
-        # Upload to Supabase Storage
-        upload_successful = document_service.upload_file_to_storage(file_path, storage_path)
-        
-        if upload_successful:
-            # Check if RAG pipeline is initialized
-            if rag_pipeline is None:
-                document_service.update_document_status(doc_id, "failed", "RAG pipeline not initialized")
-                document_service.delete_from_storage(storage_path)
-                return
-            
-            # Add to RAG system
-            result = rag_pipeline.add_document(
-                pdf_path=file_path,
-                user_id=user_id,
-                doc_id=doc_id,
-                filename=filename,
-                upload_date=upload_date
-            )
-            
-            if result["status"] == "success":
-                # Save document info to Supabase database
-                doc_data = {
-                    "id": doc_id,
-                    "filename": filename,
-                    "storage_path": storage_path,
-                    "upload_date": upload_date
-                }
-                
-                if document_service.save_document_to_supabase(doc_data):
-                    # Link document to session via document_sessions table
-                    print(f"Linking document {doc_id} to session {session_id}")
-                    session_service.link_document_to_session(doc_id, session_id)
-                    document_service.update_document_status(
-                        doc_id, 
-                        "completed", 
-                        "Document processed successfully", 
-                        result["chunks_added"]
-                    )
-                else:
-                    raise Exception("Failed to save document metadata to database")
-            else:
-                document_service.update_document_status(doc_id, "failed", result["message"])
-                # Clean up Supabase storage if processing failed
-                document_service.delete_from_storage(storage_path)
-        else:
-            raise Exception("Failed to upload file to Supabase Storage")
-            
-        # Clean up local file after successful upload
-        document_service.cleanup_local_file(file_path)
-                
-    except Exception as e:
-        document_service.update_document_status(doc_id, "failed", f"Error processing document: {str(e)}")
-        # Clean up local file on error
-        document_service.cleanup_local_file(file_path)
-        # Clean up Supabase storage on error
-        document_service.delete_from_storage(storage_path)
+UPLOAD_ROOT = Path(settings.UPLOAD_DIR)
+# user, session and doc ids become directory names - allow UUIDs and plain slugs only
+SAFE_PATH_SEGMENT = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def is_within_upload_root(path: Path) -> bool:
+    """True if path stays inside UPLOAD_ROOT once symlinks and '..' are resolved"""
+    return path.resolve().is_relative_to(UPLOAD_ROOT.resolve())
+
+def validate_path_segments(*segments: str):
+    """Reject ids that can't safely be used as a path component"""
+    for segment in segments:
+        if not SAFE_PATH_SEGMENT.fullmatch(segment or ""):
+            raise HTTPException(status_code=400, detail="Invalid user, session or document id")
+
+def safe_filename(filename: Optional[str]) -> str:
+    """Strip any directory components a client put in the upload filename"""
+    name = Path(filename or "").name
+    if not name or name in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    return name
+
+def get_upload_path(user_id: str, session_id: str, doc_id: str, filename: str) -> str:
+    """Local path for an upload, sharded by user and session to keep directories small"""
+    validate_path_segments(user_id, session_id, doc_id)
+    upload_dir = UPLOAD_ROOT / user_id / session_id
+    file_path = upload_dir / f"{doc_id}_{safe_filename(filename)}"
+    if not is_within_upload_root(file_path):
+        raise HTTPException(status_code=400, detail="Invalid upload path")
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    return str(file_path)
+
+PDF_MAGIC = b"%PDF-"
+
+async def validate_pdf_upload(file: UploadFile):
+    """Reject uploads that don't start with the PDF signature (the spooled file is rewound afterwards)"""
+    head = await file.read(len(PDF_MAGIC))
+    await file.seek(0)
+    if head != PDF_MAGIC:
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+async def save_upload_file(file: UploadFile, file_path: str):
+    """Stream an uploaded file to disk in chunks without blocking the event loop"""
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
 
 def process_document_background_test(file_path: str, user_id: str, doc_id: str, filename: str, upload_date: str, session_id: str):
     """Background task to process the document without Supabase Storage"""
     try:
-        # Update status to processing
-        document_service.update_document_status(doc_id, "processing", "Document is being processed...")
-        
+        # Status is already "processing" - the upload handler set it before scheduling this job
         print(f"Processing document: {filename}")
         
         # Check if RAG pipeline is initialized
@@ -120,6 +104,7 @@ def process_document_background_test(file_path: str, user_id: str, doc_id: str,
                 # Link document to session via document_sessions table
                 print(f"Linking document {doc_id} to session {session_id}")
                 session_service.link_document_to_session(doc_id, session_id)
+                document_service.invalidate_user_documents(user_id)
                 document_service.update_document_status(
                     doc_id, 
                     "completed", 
@@ -141,6 +126,7 @@ def process_document_background_test(file_path: str, user_id: str, doc_id: str,
 
 @router.post("/upload")
 async def upload_document(
+    request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: str = Form(...),
@@ -149,15 +135,16 @@ async def upload_document(
 ):
     """Upload and process a PDF document asynchronously"""
     
-    # Print statement to show when document is uploaded
-    print(f"📄 Document upload started - User: {user_id}, Session: {session_id}, File: {file.filename}")
+    # Log when document is uploaded
+    logger.info("📄 Document upload started - User: %s, Session: %s, File: %s", user_id, session_id, file.filename)
     
-    # Validate file type
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    # Validate file type and path components before any database or disk work
+    await validate_pdf_upload(file)
+    filename = safe_filename(file.filename)
+    validate_path_segments(user_id, session_id, *([doc_id] if doc_id else []))
     
     # Verify session exists and belongs to user
-    if not session_service.verify_session(session_id, user_id):
+    if not await asyncio.to_thread(session_service.verify_session, session_id, user_id):
         raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
     
     # Generate doc_id if not provided
@@ -165,49 +152,65 @@ async def upload_document(
         doc_id = str(uuid.uuid4())
     
     # Save uploaded file temporarily
-    upload_date = datetime.now().isoformat()
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{user_id}_{session_id}_{doc_id}_{file.filename}")
+    upload_date = iso_now()
+    file_path = await asyncio.to_thread(get_upload_path, user_id, session_id, doc_id, filename)
     
-    print(f"💾 Saving file to: {file_path}")
+    logger.info("💾 Saving file to: %s", file_path)
     
     try:
         # Save file first
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload_file(file, file_path)
+        # Release the spooled temp file now rather than after the response
+        await file.close()
         
         # Initialize status
-        document_service.update_document_status(doc_id, "processing", "Document uploaded, processing started...")
-        
-        # Add background task for processing
-        background_tasks.add_task(
-            process_document_background,
-            file_path=file_path,
-            user_id=user_id,
-            doc_id=doc_id,
-            filename=file.filename,
-            upload_date=upload_date,
-            session_id=session_id
+        await asyncio.to_thread(
+            document_service.update_document_status,
+            doc_id,
+            "processing",
+            "Document uploaded, processing started...",
+            ts=upload_date
         )
         
+        job_args = {
+            "file_path": file_path,
+            "user_id": user_id,
+            "doc_id": doc_id,
+            "filename": filename,
+            "upload_date": upload_date,
+            "session_id": session_id
+        }
+        
+        arq_pool = request.app.state.arq_pool
+        if arq_pool is not None:
+            # Hand processing to the ARQ worker so embedding doesn't compete with request handling
+            await arq_pool.enqueue_job("process_document", **job_args)
+        else:
+            # No Redis configured - process in-process after the response is sent
+            background_tasks.add_task(process_document_background, **job_args)
+        
         # Return immediately with processing status
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=202,  # 202 Accepted - processing in background
             content={
                 "message": "Document uploaded successfully and is being processed",
                 "doc_id": doc_id,
                 "session_id": session_id,
-                "filename": file.filename,
+                "filename": filename,
                 "status": "processing",
-                "status_check_url": f"/documents/{user_id}/{doc_id}/status"
+                "status_check_url": request.app.url_path_for("get_document_status", user_id=user_id, doc_id=doc_id)
             }
         )
             
+    except HTTPException:
+        raise
     except Exception as e:
-        document_service.cleanup_local_file(file_path)
+        await asyncio.to_thread(document_service.cleanup_local_file, file_path)
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
 @router.post("/upload-test")
 async def upload_document_test(
+    request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: str = Form(...),
@@ -216,12 +219,13 @@ async def upload_document_test(
 ):
     """Upload and process a PDF document without Supabase Storage (for testing)"""
     
-    # Validate file type
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    # Validate file type and path components before any database or disk work
+    await validate_pdf_upload(file)
+    filename = safe_filename(file.filename)
+    validate_path_segments(user_id, session_id, *([doc_id] if doc_id else []))
     
     # Verify session exists and belongs to user
-    if not session_service.verify_session(session_id, user_id):
+    if not await asyncio.to_thread(session_service.verify_session, session_id, user_id):
         raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
     
     # Generate doc_id if not provided
@@ -229,16 +233,23 @@ async def upload_document_test(
         doc_id = str(uuid.uuid4())
     
     # Save uploaded file temporarily
-    upload_date = datetime.now().isoformat()
-    file_path = os.path.join(settings.UPLOAD_DIR, f"{user_id}_{session_id}_{doc_id}_{file.filename}")
+    upload_date = iso_now()
+    file_path = await asyncio.to_thread(get_upload_path, user_id, session_id, doc_id, filename)
     
     try:
         # Save file first
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload_file(file, file_path)
+        # Release the spooled temp file now rather than after the response
+        await file.close()
         
         # Initialize status
-        document_service.update_document_status(doc_id, "processing", "Document uploaded, processing started...")
+        await asyncio.to_thread(
+            document_service.update_document_status,
+            doc_id,
+            "processing",
+            "Document uploaded, processing started...",
+            ts=upload_date
+        )
         
         # Add background task for processing (without Supabase Storage)
         background_tasks.add_task(
@@ -246,34 +257,36 @@ async def upload_document_test(
             file_path=file_path,
             user_id=user_id,
             doc_id=doc_id,
-            filename=file.filename,
+            filename=filename,
             upload_date=upload_date,
             session_id=session_id
         )
         
         # Return immediately with processing status
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=202,  # 202 Accepted - processing in background
             content={
                 "message": "Document uploaded successfully and is being processed (test mode)",
                 "doc_id": doc_id,
                 "session_id": session_id,
-                "filename": file.filename,
+                "filename": filename,
                 "status": "processing",
-                "status_check_url": f"/documents/{user_id}/{doc_id}/status"
+                "status_check_url": request.app.url_path_for("get_document_status", user_id=user_id, doc_id=doc_id)
             }
         )
             
+    except HTTPException:
+        raise
     except Exception as e:
         # Clean up file on error
-        document_service.cleanup_local_file(file_path)
+        await asyncio.to_thread(document_service.cleanup_local_file, file_path)
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
 @router.get("/{user_id}")
 async def get_user_documents(user_id: str, session_id: Optional[str] = None):
     """Get all documents for a user or specific session"""
     
-    documents = document_service.get_user_documents(user_id, session_id)
+    documents = await asyncio.to_thread(document_service.get_user_documents, user_id, session_id)
     
     if documents is None:
         raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
@@ -289,32 +302,89 @@ async def get_user_documents(user_id: str, session_id: Optional[str] = None):
 async def delete_document(user_id: str, doc_id: str):
     """Delete a document"""
     
+    # Ownership check, database rows, storage object and vectors are all removed by the service
+    result = await asyncio.to_thread(document_service.delete_document, doc_id, user_id)
+    
+    if not result["success"]:
+        if not result["document_found"]:
+            raise HTTPException(status_code=404, detail=result["error"])
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {result['error']}")
+    
+    semantic_cache.invalidate_document(doc_id)
+    
+    # Also delete the physical file - the upload dir mirrors the storage layout
+    file_path = UPLOAD_ROOT / result["storage_path"]
+    if is_within_upload_root(file_path):
+        await asyncio.to_thread(document_service.cleanup_local_file, str(file_path))
+    
+    return ORJSONResponse(
+        status_code=200,
+        content={
+            "status": "success",
+            "message": result["message"],
+            "doc_id": doc_id
+        }
+    )
+
+FINAL_STATUSES = ("completed", "failed")
+STATUS_EVENT_HEARTBEAT = 15  # seconds between keep-alive comments
+STATUS_POLL_INTERVAL = 1  # seconds, only used without Redis
+
+async def document_status_events(doc_id: str):
+    """Yield SSE events for a document's status until processing finishes"""
+    if async_redis_client is None:
+        # Single-process fallback: watch the in-memory status
+        last_status = None
+        while True:
+            status_info = await asyncio.to_thread(document_service.get_document_status, doc_id)
+            if status_info != last_status:
+                yield f"data: {json.dumps(status_info)}\n\n"
+                last_status = status_info
+            if status_info is None or status_info["status"] in FINAL_STATUSES:
+                return
+            await asyncio.sleep(STATUS_POLL_INTERVAL)
+    
+    pubsub = async_redis_client.pubsub()
+    await pubsub.subscribe(f"{STATUS_CHANNEL_PREFIX}{doc_id}")
     try:
-        result = rag_pipeline.delete_document(doc_id, user_id)
+        # Read the current status after subscribing so no transition is missed
+        status_info = await asyncio.to_thread(document_service.get_document_status, doc_id)
+        yield f"data: {json.dumps(status_info)}\n\n"
+        if status_info is None or status_info["status"] in FINAL_STATUSES:
+            return
         
-        if result["status"] == "success":
-            # Also delete the physical file
-            file_pattern = f"{user_id}_{doc_id}_"
-            for filename in os.listdir(settings.UPLOAD_DIR):
-                if filename.startswith(file_pattern):
-                    file_path = os.path.join(settings.UPLOAD_DIR, filename)
-                    document_service.cleanup_local_file(file_path)
-            
-            return JSONResponse(
-                status_code=200,
-                content=result
-            )
-        else:
-            raise HTTPException(status_code=404, detail=result["message"])
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=STATUS_EVENT_HEARTBEAT)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {message['data']}\n\n"
+            if json.loads(message["data"])["status"] in FINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+@router.get("/{user_id}/{doc_id}/events")
+async def stream_document_status(user_id: str, doc_id: str):
+    """Stream processing status updates for a document as Server-Sent Events"""
+    
+    status_info = await asyncio.to_thread(document_service.get_document_status, doc_id)
+    
+    if status_info is None:
+        raise HTTPException(status_code=404, detail="Document not found or status not available")
+    
+    return StreamingResponse(
+        document_status_events(doc_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@router.get("/{user_id}/{doc_id}/status")
+@router.get("/{user_id}/{doc_id}/status", name="get_document_status")
 async def get_document_status(user_id: str, doc_id: str):
     """Get the processing status of a document"""
     
-    status_info = document_service.get_document_status(doc_id)
+    status_info = await asyncio.to_thread(document_service.get_document_status, doc_id)
     
     if status_info is None:
         raise HTTPException(status_code=404, detail="Document not found or status not available")
@@ -373,7 +443,7 @@ async def get_document_url(user_id: str, doc_id: str):
     """Generate a signed URL for document viewing"""
     try:
         # Get document from database
-        document = document_service.get_document(doc_id, user_id)
+        document = await asyncio.to_thread(document_service.get_document, doc_id, user_id)
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found or doesn't belong to user")
@@ -383,14 +453,14 @@ async def get_document_url(user_id: str, doc_id: str):
             raise HTTPException(status_code=404, detail="Document storage path not found")
         
         # Generate signed URL from Supabase Storage
-        signed_url = document_service.generate_signed_url(storage_path)
+        signed_url = await asyncio.to_thread(document_service.generate_signed_url, storage_path)
         
         if signed_url:
             return {
                 "doc_id": doc_id,
                 "user_id": user_id,
-                "url": signed_url,
-                "expires_in": 3600,  # 1 hour
+                "url": signed_url["url"],
+                "expires_in": signed_url["expires_in"],  # seconds left - cached URLs were signed earlier
                 "filename": document.get('filename', 'document.pdf')
             }
         else:
@@ -406,24 +476,33 @@ async def get_all_document_urls(user_id: str, session_id: Optional[str] = None):
     """Generate signed URLs for all user documents"""
     try:
         # Get all documents for user/session
-        documents = document_service.get_user_documents(user_id, session_id)
+        # Only the fields needed to sign URLs
+        documents = await asyncio.to_thread(
+            document_service.get_user_documents,
+            user_id,
+            session_id,
+            "id,filename,storage_path"
+        )
         
         if documents is None:
             raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
         
+        # Sign every document's URL in a single Storage request
+        documents = [doc for doc in documents if doc.get('id') and doc.get('storage_path')]
+        signed_urls = await asyncio.to_thread(
+            document_service.generate_signed_urls,
+            [doc['storage_path'] for doc in documents]
+        )
+        
         urls = {}
         for document in documents:
-            doc_id = document.get('id')
-            storage_path = document.get('storage_path')
-            
-            if doc_id and storage_path:
-                signed_url = document_service.generate_signed_url(storage_path)
-                if signed_url:
-                    urls[doc_id] = {
-                        "url": signed_url,
-                        "filename": document.get('filename', 'document.pdf'),
-                        "expires_in": 3600
-                    }
+            signed_url = signed_urls.get(document['storage_path'])
+            if signed_url:
+                urls[document['id']] = {
+                    "url": signed_url["url"],
+                    "filename": document.get('filename', 'document.pdf'),
+                    "expires_in": signed_url["expires_in"]
+                }
         
         return {
             "user_id": user_id,
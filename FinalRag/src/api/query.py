@@ -1,35 +1,76 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+from fastapi import APIRouter, HTTPException, BackgroundTasks
+from src.core.responses import ORJSONResponse
 from src.models.schemas import QueryRequest, QueryResponse
 from src.services.session_service import session_service
 from src.services.document_service import document_service
 from src.services.rag_pipeline.pipeline import rag_pipeline
+from src.services.semantic_cache import semantic_cache
+from src.core.logger import logger
 
 router = APIRouter(prefix="/query", tags=["query"])
 
+GENERAL_RESPONSE = "I'd be happy to help! Please select some documents using the checkboxes in the sidebar so I can provide specific information from your documents."
+
+# Fields of the no-documents response that never change, built once at import
+_EMPTY_DOCS_TEMPLATE = {
+    "status": "success",
+    "retrieved_chunks": [],
+    "masked_chunks": [],
+    "maskedResponse": GENERAL_RESPONSE,
+    "unmasked_response": GENERAL_RESPONSE,
+    "phase2": "",
+    "scaled_response": GENERAL_RESPONSE,
+    "unscaled_response": GENERAL_RESPONSE,
+    "retrieved_metadata": [],
+    "processed_docs": []
+}
+
+def _build_empty_response(request: QueryRequest) -> dict:
+    """Fill the per-request fields into the no-documents response"""
+    return {
+        **_EMPTY_DOCS_TEMPLATE,
+        "session_id": request.session_id,
+        "user_query": request.query,
+        "transformed_query": request.query
+    }
+
+def _save_chat_log(session_id: str, prompt: str, response: str):
+    """Background chat-log save - the response has already been sent, so failures can only be logged"""
+    result = session_service.save_chat_log(session_id=session_id, prompt=prompt, response=response)
+    if not result["success"]:
+        logger.warning("⚠️ Failed to save chat log - Session: %s, Error: %s", session_id, result["error"])
+
 @router.post("/", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, background_tasks: BackgroundTasks):
     """Process a query against selected documents and save to chat logs"""
     
     try:
+        # Verify the session and look up document statuses concurrently - the reads are independent
+        session_valid, statuses = await asyncio.gather(
+            asyncio.to_thread(session_service.verify_session, request.session_id, request.user_id),
+            asyncio.to_thread(document_service.get_document_statuses, request.doc_ids)
+        )
+        
         # Verify session exists and belongs to user
-        if not session_service.verify_session(request.session_id, request.user_id):
+        if not session_valid:
             raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
         
         # Check if all requested documents are ready (if any documents are provided)
         not_ready_docs = []
         if request.doc_ids:  # Only check if documents are provided
             for doc_id in request.doc_ids:
-                status_info = document_service.get_document_status(doc_id)
-                if status_info:
-                    status = status_info["status"]
-                    if status == "processing":
-                        not_ready_docs.append(f"{doc_id} (processing)")
-                    elif status == "failed":
-                        not_ready_docs.append(f"{doc_id} (failed)")
+                # Unknown ids (or a failed status lookup) don't block the query - retrieval just finds no chunks for them
+                status_info = statuses.get(doc_id)
+                if not status_info:
+                    continue
+                if status_info["status"] == "processing":
+                    not_ready_docs.append(f"{doc_id} (processing)")
+                elif status_info["status"] == "failed":
+                    not_ready_docs.append(f"{doc_id} (failed)")
         
         if not_ready_docs:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=202,  # Accepted but not ready
                 content={
                     "status": "not_ready",
@@ -48,52 +89,53 @@ async def process_query(request: QueryRequest):
         
         # Handle empty doc_ids - return appropriate response
         if not request.doc_ids or len(request.doc_ids) == 0:
-            # Save general query response to chat log
-            general_response = "I'd be happy to help! Please select some documents using the checkboxes in the sidebar so I can provide specific information from your documents."
-            
-            chat_log_result = session_service.save_chat_log(
+            # Save the chat log after the response is sent - the client doesn't need its id
+            background_tasks.add_task(
+                _save_chat_log,
                 session_id=request.session_id,
                 prompt=request.query,
-                response=general_response
+                response=GENERAL_RESPONSE
             )
             
-            response_data = {
-                "status": "success",
-                "session_id": request.session_id,
-                "user_query": request.query,
-                "transformed_query": request.query,
-                "retrieved_chunks": [],
-                "masked_chunks": [],
-                "maskedResponse": general_response,
-                "unmasked_response": general_response,
-                "phase2": "",
-                "scaled_response": general_response,
-                "unscaled_response": general_response,
-                "retrieved_metadata": [],
-                "processed_docs": []
-            }
-            
-            if chat_log_result["success"]:
-                response_data["chat_log_id"] = chat_log_result["chat_log_id"]
-            else:
-                response_data["warning"] = "Query processed successfully but failed to save chat log"
-            
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=200,
-                content=response_data
+                content=_build_empty_response(request)
             )
         
-        # Process the query through RAG pipeline
-        result = rag_pipeline.process_query(
-            query=request.query,
-            user_id=request.user_id,
-            doc_ids=request.doc_ids,
-            k=request.k
+        # Reuse the answer to a near-identical earlier query over the same documents
+        result = await asyncio.to_thread(
+            semantic_cache.lookup,
+            request.query,
+            request.user_id,
+            request.doc_ids,
+            request.k
         )
+        cache_hit = result is not None
+        
+        if not cache_hit:
+            # Process the query through RAG pipeline (blocking LLM/embedding work runs in a thread)
+            result = await asyncio.to_thread(
+                rag_pipeline.process_query,
+                query=request.query,
+                user_id=request.user_id,
+                doc_ids=request.doc_ids,
+                k=request.k
+            )
+            
+            if result["status"] == "success":
+                await asyncio.to_thread(
+                    semantic_cache.store,
+                    request.query,
+                    request.user_id,
+                    request.doc_ids,
+                    request.k,
+                    result
+                )
         
         if result["status"] == "success":
-            # Save chat log to database
-            chat_log_result = session_service.save_chat_log(
+            # Save chat log to database after the response is sent
+            background_tasks.add_task(
+                _save_chat_log,
                 session_id=request.session_id,
                 prompt=request.query,
                 response=result["unscaled_response"]  # Use unscaled_response instead of scaled_response
@@ -102,14 +144,9 @@ async def process_query(request: QueryRequest):
             # Use the full result as response_data to include all pipeline outputs
             response_data = result.copy()  # Create a copy to avoid modifying original
             response_data["session_id"] = request.session_id  # Ensure session_id is included
+            response_data["cache_hit"] = cache_hit
             
-            if chat_log_result["success"]:
-                response_data["chat_log_id"] = chat_log_result["chat_log_id"]
-            else:
-                # If chat log saving failed, still return the result but with a warning
-                response_data["warning"] = "Query processed successfully but failed to save chat log"
-            
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=200,
                 content=response_data
             )
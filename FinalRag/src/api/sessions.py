@@ -1,6 +1,9 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from src.models.schemas import CreateSessionRequest, SessionResponse
 from src.services.session_service import session_service
+from src.services.document_service import document_service
+from src.core.logger import logger
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
@@ -8,11 +11,11 @@ router = APIRouter(prefix="/sessions", tags=["sessions"])
 async def create_chat_session(request: CreateSessionRequest):
     """Create a new chat session for a user"""
     
-    result = session_service.create_session(request.user_id, request.name)
+    result = await asyncio.to_thread(session_service.create_session, request.user_id, request.name)
     
     if result["success"]:
-        # Print statement to show new session creation
-        print(f"💬 New session created - Session ID: {result['session_id']}, User: {request.user_id}, Name: {request.name or 'Unnamed'}")
+        # Log new session creation
+        logger.info("💬 New session created - Session ID: %s, User: %s, Name: %s", result['session_id'], request.user_id, request.name or 'Unnamed')
         
         return SessionResponse(
             session_id=result["session_id"],
@@ -27,7 +30,7 @@ async def create_chat_session(request: CreateSessionRequest):
 async def get_user_sessions(user_id: str):
     """Get all sessions for a user"""
     
-    result = session_service.get_user_sessions(user_id)
+    result = await asyncio.to_thread(session_service.get_user_sessions, user_id)
     
     if result["success"]:
         return {
@@ -45,7 +48,7 @@ async def get_chat_history(
 ):
     """Get chat history for a session"""
     
-    result = session_service.get_chat_history(session_id, user_id)
+    result = await asyncio.to_thread(session_service.get_chat_history, session_id, user_id)
     
     if result["success"]:
         return {
@@ -64,7 +67,7 @@ async def get_session_documents(
 ):
     """Get all documents linked to a session"""
     
-    result = session_service.get_session_documents(session_id, user_id)
+    result = await asyncio.to_thread(session_service.get_session_documents, session_id, user_id)
     
     if result["success"]:
         return {
@@ -86,12 +89,14 @@ async def link_document_to_session(
     
     try:
         # Verify session belongs to user
-        if not session_service.verify_session(session_id, user_id):
+        if not await asyncio.to_thread(session_service.verify_session, session_id, user_id):
             raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
         
-        result = session_service.link_document_to_session(document_id, session_id)
+        result = await asyncio.to_thread(session_service.link_document_to_session, document_id, session_id)
         
         if result["success"]:
+            document_service.invalidate_user_documents(user_id)
+            document_service.invalidate_document(document_id)
             return {"message": "Document linked to session successfully"}
         else:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -108,12 +113,14 @@ async def unlink_document_from_session(
     
     try:
         # Verify session belongs to user
-        if not session_service.verify_session(session_id, user_id):
+        if not await asyncio.to_thread(session_service.verify_session, session_id, user_id):
             raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
         
-        result = session_service.unlink_document_from_session(document_id, session_id)
+        result = await asyncio.to_thread(session_service.unlink_document_from_session, document_id, session_id)
         
         if result["success"]:
+            document_service.invalidate_user_documents(user_id)
+            document_service.invalidate_document(document_id)
             return {"message": result["message"]}
         else:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -124,10 +131,6 @@ async def unlink_document_from_session(
 async def save_chat_log(session_id: str, request: dict):
     """Save a chat log entry (user message or AI response)"""
     
-    # Verify session belongs to user
-    if not session_service.verify_session(session_id, request.get("user_id")):
-        raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
-    
     # Extract prompt and response from request
     prompt = request.get("prompt", "")
     response = request.get("response", "")
@@ -135,7 +138,14 @@ async def save_chat_log(session_id: str, request: dict):
     if not prompt and not response:
         raise HTTPException(status_code=400, detail="Either prompt or response must be provided")
     
-    result = session_service.save_chat_log(session_id, prompt, response)
+    # Session ownership check and insert happen in one RPC
+    result = await asyncio.to_thread(
+        session_service.log_chat_if_session_valid,
+        session_id,
+        request.get("user_id"),
+        prompt,
+        response
+    )
     
     if result["success"]:
         return {
@@ -144,6 +154,8 @@ async def save_chat_log(session_id: str, request: dict):
             "session_id": session_id,
             "message": "Chat log saved successfully"
         }
+    elif not result["session_found"]:
+        raise HTTPException(status_code=404, detail=result["error"])
     else:
         raise HTTPException(status_code=500, detail=result["error"])
 
@@ -156,12 +168,13 @@ async def delete_session(
     
     try:
         # Verify session belongs to user
-        if not session_service.verify_session(session_id, user_id):
+        if not await asyncio.to_thread(session_service.verify_session, session_id, user_id):
             raise HTTPException(status_code=404, detail="Session not found or doesn't belong to user")
         
-        result = session_service.delete_session(session_id, user_id)
+        result = await asyncio.to_thread(session_service.delete_session, session_id, user_id)
         
         if result["success"]:
+            document_service.invalidate_user_documents(user_id)
             return {"message": "Session deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail=result["error"])
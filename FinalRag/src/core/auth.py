@@ -2,7 +2,11 @@
 Authentication utilities for FinalRAG API
 """
 import os
+import time
+import hashlib
+import threading
 import jwt
+from cachetools import TLRUCache
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -12,18 +16,51 @@ from src.db.supabase_client import supabase
 JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "your-jwt-secret")
 JWT_ALGORITHM = "HS256"
 
+# Verified tokens are cached for at most this long (and never past their exp claim)
+TOKEN_CACHE_TTL = 300  # seconds
+
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
 class AuthUser:
     """Authenticated user data"""
-    def __init__(self, user_id: str, email: str, metadata: Dict[str, Any] = None):
+    def __init__(self, user_id: str, email: str, metadata: Dict[str, Any] = None, expires_at: Optional[float] = None):
         self.id = user_id
         self.email = email
         self.metadata = metadata or {}
+        self.expires_at = expires_at  # Token exp claim (epoch seconds), if known
+
+def _token_cache_expiry(key: bytes, user: AuthUser, now: float) -> float:
+    """Expire cached users after TOKEN_CACHE_TTL or at the token's exp, whichever comes first"""
+    expiry = now + TOKEN_CACHE_TTL
+    if user.expires_at is not None:
+        expiry = min(expiry, now + (user.expires_at - time.time()))
+    return expiry
+
+# Cache keyed on a token digest so raw tokens aren't kept in memory
+_token_cache = TLRUCache(maxsize=10_000, ttu=_token_cache_expiry, timer=time.monotonic)
+_token_cache_lock = threading.Lock()
 
 def verify_token(token: str) -> Optional[AuthUser]:
-    """Verify JWT token and return user data"""
+    """Verify JWT token and return user data (successful verifications are cached)"""
+    if not token:
+        return None
+    
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with _token_cache_lock:
+        user = _token_cache.get(key)
+    if user is not None:
+        return user
+    
+    user = _decode_token(token)
+    # Failed verifications are not cached
+    if user is not None:
+        with _token_cache_lock:
+            _token_cache[key] = user
+    return user
+
+def _decode_token(token: str) -> Optional[AuthUser]:
+    """Decode and verify a JWT token"""
     try:
         # For Supabase JWT tokens, we need to verify with Supabase
         # This is a simplified version - in production, you'd verify the JWT properly
@@ -39,6 +76,7 @@ def verify_token(token: str) -> Optional[AuthUser]:
         # payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         # user_id = payload.get("sub")
         # email = payload.get("email")
+        # expires_at = payload.get("exp")  # pass to AuthUser so the cache honours it
         
         # For development, we'll accept any token and return a test user
         # In production, implement proper JWT verification
@@ -0,0 +1,15 @@
+import time
+from datetime import datetime
+
+# (epoch second, ISO string) - swapped as one tuple so threads never see a mismatched pair
+_cached_now = (0, "")
+
+def iso_now() -> str:
+    """Current local time as an ISO string at second precision, formatted at most once per second"""
+    global _cached_now
+    second = int(time.time())
+    cached_second, cached_iso = _cached_now
+    if second != cached_second:
+        cached_iso = datetime.fromtimestamp(second).isoformat()
+        _cached_now = (second, cached_iso)
+    return cached_iso
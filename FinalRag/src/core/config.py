@@ -10,10 +10,15 @@ class Settings:
     API_VERSION = "1.0.0"
     API_HOST = "0.0.0.0"
     API_PORT = int(os.getenv("PORT", 8000))  # Use PORT from environment (Render requirement)
+    # Several workers need Redis to share document status, so default to one without it.
+    # Every worker loads its own copy of the embedding model (~1.3 GB), so the default stays small -
+    # size WEB_CONCURRENCY to the host's memory, not its CPU count
+    API_WORKERS = int(os.getenv("WEB_CONCURRENCY", min(os.cpu_count() or 1, 2) if os.getenv("REDIS_URL") else 1))
    
     # File Upload Settings
     UPLOAD_DIR = "data/uploads"
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB per read/write when streaming uploads to disk
     ALLOWED_EXTENSIONS = [".pdf"]
    
     # Data directories
@@ -26,6 +31,26 @@ class Settings:
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
     SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "documents")
    
+    # Redis Settings (optional - shares document status across uvicorn workers)
+    REDIS_URL = os.getenv("REDIS_URL")
+    DOCUMENT_STATUS_TTL = 24 * 60 * 60  # 24 hours
+    STATUS_MISS_CACHE_TTL = 2  # seconds an unknown document id is remembered as missing
+   
+    # Read Cache Settings (per-process cache for document/session listings)
+    LIST_CACHE_SIZE = 10_000
+    LIST_CACHE_TTL = 30  # seconds
+    # Signed URLs are reused until 5 minutes before they would expire
+    SIGNED_URL_EXPIRES_IN = 3600  # seconds
+    SIGNED_URL_CACHE_TTL = SIGNED_URL_EXPIRES_IN - 300
+   
+    # Semantic Answer Cache (reuses answers to near-identical queries over the same documents)
+    SEMANTIC_CACHE_THRESHOLD = 0.95  # minimum cosine similarity for a hit
+    SEMANTIC_CACHE_TTL = 60 * 60  # seconds
+    SEMANTIC_CACHE_MAX_ENTRIES = 256  # per user/document set
+    SEMANTIC_CACHE_MAX_BUCKETS = 10_000
+    EXACT_CACHE_SIZE = 10_000  # exact repeats of a query, checked before embedding
+    EXACT_CACHE_TTL = 10 * 60  # seconds
+   
     # OpenAI API Settings
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # or "gpt-4o", "gpt-3.5-turbo"
@@ -36,6 +61,9 @@ class Settings:
    
     # RAG Settings
     DEFAULT_K = 4
+    # Run the embedding model in fp16 on GPU / dynamic int8 on CPU. Opt-in: query vectors from a
+    # quantized model drift from chunks embedded at full precision, so re-embed existing collections first
+    EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"
    
     @classmethod
     def validate(cls):
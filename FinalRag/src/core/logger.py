@@ -0,0 +1,16 @@
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Request handlers only enqueue records; a listener thread does the stdout writes
+_log_queue = queue.SimpleQueue()
+
+logger = logging.getLogger("finalrag")
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(_log_queue))
+logger.propagate = False
+
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(logging.Formatter("%(message)s"))
+log_listener = QueueListener(_log_queue, _stream_handler)
@@ -0,0 +1,10 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson, noticeably faster than the stdlib encoder for large payloads"""
+    
+    def render(self, content: Any) -> bytes:
+        # Non-str keys (e.g. int-keyed dicts from LLM JSON) are stringified like the stdlib encoder does
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
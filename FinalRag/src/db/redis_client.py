@@ -0,0 +1,19 @@
+import redis
+import redis.asyncio as aioredis
+from src.core.config import settings
+
+def get_redis_client():
+    """Get Redis client instance, or None when REDIS_URL is not configured"""
+    if not settings.REDIS_URL:
+        return None
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+def get_async_redis_client():
+    """Get asyncio Redis client instance (used for pub/sub), or None when REDIS_URL is not configured"""
+    if not settings.REDIS_URL:
+        return None
+    return aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# Global client instances
+redis_client = get_redis_client()
+async_redis_client = get_async_redis_client()
@@ -1,5 +1,6 @@
 import os
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,9 +14,21 @@ SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "documents")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
 
+# Shared HTTP/2 connection pool so every Supabase call reuses keep-alive connections
+# instead of paying a fresh TCP/TLS handshake per request
+# The transport also retries failed connection attempts, which are safe to repeat
+http_client = httpx.Client(
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+    )
+)
+
 def get_supabase_client() -> Client:
-    """Get Supabase client instance"""
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Get Supabase client instance backed by the shared connection pool"""
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=http_client))
 
 # Global client instance
 supabase: Client = get_supabase_client()
@@ -1,43 +1,107 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import orjson
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from fastapi.middleware.gzip import GZipMiddleware
+from arq import create_pool
+from arq.connections import RedisSettings
 from src.core.config import settings
+from src.core.clock import iso_now
+from src.core.responses import ORJSONResponse
+from src.core.logger import log_listener
+from src.db.supabase_client import supabase, http_client
+from src.services.rag_pipeline.document_manager import document_manager
 from src.api import documents, sessions, query
 
+def warm_supabase():
+    """Open the pooled Supabase connection so the first request doesn't pay the TLS handshake"""
+    try:
+        supabase.table("sessions").select("id").limit(1).execute()
+    except Exception as e:
+        print(f"Supabase warm-up failed: {e}")
+
+def warm_embeddings():
+    """Run one embedding so the model's lazy initialization happens before traffic arrives"""
+    try:
+        document_manager.embedding.embed_query("warm-up")
+    except Exception as e:
+        print(f"Embedding warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    log_listener.start()
+    # Document processing goes to the ARQ worker when Redis is configured
+    app.state.arq_pool = await create_pool(RedisSettings.from_dsn(settings.REDIS_URL)) if settings.REDIS_URL else None
+    await asyncio.gather(asyncio.to_thread(warm_supabase), asyncio.to_thread(warm_embeddings))
+    yield
+    if app.state.arq_pool is not None:
+        await app.state.arq_pool.aclose()
+    # Release pooled Supabase connections on shutdown
+    http_client.close()
+    # Flush any queued log records
+    log_listener.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.API_TITLE,
-    version=settings.API_VERSION
+    version=settings.API_VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
+    # A frozenset makes Starlette's per-request "origin in allow_origins" check a hash lookup
+    allow_origins=frozenset({
         "http://localhost:3000", 
         "http://127.0.0.1:3000",
         "http://localhost:5173",  # Vite frontend
         "http://127.0.0.1:5173"
-    ],
+    }),
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
+# Compress larger JSON bodies (query results, chat history, document lists);
+# SSE streams are excluded by the middleware
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include routers
 app.include_router(documents.router)
 app.include_router(sessions.router)
 app.include_router(query.router)
 
+# Static bodies serialized once instead of per request
+ROOT_BODY = orjson.dumps({"message": "RAG Document Processing API is running"})
+# (timestamp, body) - the health body only changes when the second-granular timestamp does
+_health_cache = ("", b"")
+
 @app.get("/")
 async def root():
-    return {"message": "RAG Document Processing API is running"}
+    return Response(ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    global _health_cache
+    timestamp = iso_now()
+    if _health_cache[0] != timestamp:
+        _health_cache = (timestamp, orjson.dumps({"status": "healthy", "timestamp": timestamp}))
+    return Response(_health_cache[1], media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
+    uvicorn.run(
+        "src.main:app",
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        workers=settings.API_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
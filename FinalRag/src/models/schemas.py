@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class QueryRequest(BaseModel):
@@ -6,7 +6,7 @@ class QueryRequest(BaseModel):
     user_id: str
     session_id: str
     doc_ids: List[str]
-    k: Optional[int] = 4
+    k: int = Field(default=4, gt=0, le=50)  # Capped so one request can't pull an unbounded number of chunks
 
 class CreateSessionRequest(BaseModel):
     user_id: str
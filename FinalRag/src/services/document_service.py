@@ -1,33 +1,150 @@
 import os
+import json
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from typing import Dict, Any, Optional, List, Tuple
 from src.db.supabase_client import supabase, SUPABASE_BUCKET
+from src.db.redis_client import redis_client
 from src.core.config import settings
+from src.core.clock import iso_now
+
+STATUS_KEY_PREFIX = "docstatus:"
+STATUS_CHANNEL_PREFIX = "docstatus-events:"
+# Document columns callers actually read; timestamps like created_at/updated_at are never used
+DOCUMENT_FIELDS = "id, filename, storage_path, upload_date"
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (ValueError, TypeError, AttributeError):
+        return False
 
 class DocumentService:
     def __init__(self):
-        self.document_status = {}
+        # In-process fallback used when Redis is not configured (single worker only)
+        # Bounded and expiring like the Redis keys, so finished uploads don't accumulate
+        self.document_status = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.DOCUMENT_STATUS_TTL)
+        self._status_lock = threading.Lock()
+        # Short-lived cache of document listings keyed on (user_id, session_id)
+        self._docs_cache = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.LIST_CACHE_TTL)
+        self._docs_cache_lock = threading.Lock()
+        # Signed URLs keyed on (storage_path, expires_in) -> (url, monotonic expiry), dropped well before they expire
+        self._url_cache = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.SIGNED_URL_CACHE_TTL)
+        self._url_cache_lock = threading.Lock()
+        # Document rows keyed on (doc_id, user_id), user_id None for unchecked lookups
+        self._doc_cache = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.LIST_CACHE_TTL)
+        self._doc_cache_lock = threading.Lock()
+        # Document ids recently found neither tracked nor saved, so polling for them doesn't hit the database
+        self._missing_status_cache = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.STATUS_MISS_CACHE_TTL)
+        self._missing_status_lock = threading.Lock()
     
-    def update_document_status(self, doc_id: str, status: str, message: str = "", chunks_added: int = 0):
-        """Update document processing status"""
-        self.document_status[doc_id] = {
+    def update_document_status(self, doc_id: str, status: str, message: str = "", chunks_added: int = 0, ts: Optional[str] = None):
+        """Update document processing status (ts: pre-formatted timestamp, defaults to now)"""
+        status_info = {
             "status": status,  # "processing", "completed", "failed"
             "message": message,
             "chunks_added": chunks_added,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": ts or iso_now()
         }
+        
+        if redis_client is not None:
+            payload = json.dumps(status_info)
+            # Store the status and notify SSE subscribers in one round trip
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(f"{STATUS_KEY_PREFIX}{doc_id}", settings.DOCUMENT_STATUS_TTL, payload)
+            pipe.publish(f"{STATUS_CHANNEL_PREFIX}{doc_id}", payload)
+            pipe.execute()
+        else:
+            with self._status_lock:
+                self.document_status[doc_id] = status_info
+        
+        with self._missing_status_lock:
+            self._missing_status_cache.pop(doc_id, None)
     
     def get_document_status(self, doc_id: str) -> Dict[str, Any]:
         """Get document processing status"""
-        if doc_id not in self.document_status:
-            return None
-        return self.document_status[doc_id]
+        return self.get_document_statuses([doc_id]).get(doc_id)
+    
+    def get_document_statuses(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get processing statuses for several documents, falling back to the database for finished ones.
+        
+        Documents that are neither tracked nor saved are left out of the result.
+        """
+        if not doc_ids:
+            return {}
+        
+        if redis_client is not None:
+            values = redis_client.mget([f"{STATUS_KEY_PREFIX}{doc_id}" for doc_id in doc_ids])
+            statuses = {doc_id: json.loads(value) for doc_id, value in zip(doc_ids, values) if value}
+        else:
+            with self._status_lock:
+                found = [(doc_id, self.document_status.get(doc_id)) for doc_id in doc_ids]
+            statuses = {doc_id: status_info for doc_id, status_info in found if status_info}
+        
+        # Status expired or was tracked by another process - check which documents were saved in one query
+        with self._missing_status_lock:
+            untracked_ids = [
+                doc_id for doc_id in doc_ids
+                if doc_id not in statuses and doc_id not in self._missing_status_cache
+            ]
+        # documents.id is a UUID column - one malformed id would make Postgres reject the whole filter
+        untracked_ids = [doc_id for doc_id in untracked_ids if _is_uuid(doc_id)]
+        if untracked_ids:
+            try:
+                response = supabase.table('documents').select('id').in_('id', untracked_ids).execute()
+                timestamp = iso_now()
+                resolved = {
+                    row['id']: {
+                        "status": "completed",
+                        "message": "Document processed successfully",
+                        "chunks_added": 0,  # Chunk count is only known while status is tracked
+                        "timestamp": timestamp
+                    }
+                    for row in response.data or []
+                }
+                statuses.update(resolved)
+                self._remember_statuses(resolved)
+                with self._missing_status_lock:
+                    for doc_id in untracked_ids:
+                        if doc_id not in resolved:
+                            self._missing_status_cache[doc_id] = True
+            except Exception as e:
+                print(f"Error checking documents in database: {e}")
+        
+        return statuses
+    
+    def _remember_statuses(self, statuses: Dict[str, Dict[str, Any]]):
+        """Store statuses resolved from the database so repeat lookups skip the query"""
+        if not statuses:
+            return
+        
+        if redis_client is not None:
+            pipe = redis_client.pipeline(transaction=False)
+            for doc_id, status_info in statuses.items():
+                pipe.setex(f"{STATUS_KEY_PREFIX}{doc_id}", settings.DOCUMENT_STATUS_TTL, json.dumps(status_info))
+            pipe.execute()
+        else:
+            with self._status_lock:
+                self.document_status.update(statuses)
+    
+    def clear_document_status(self, doc_id: str):
+        """Stop tracking a document's processing status"""
+        if redis_client is not None:
+            redis_client.delete(f"{STATUS_KEY_PREFIX}{doc_id}")
+        else:
+            with self._status_lock:
+                self.document_status.pop(doc_id, None)
     
     def save_document_to_supabase(self, doc_data: Dict[str, Any]) -> bool:
         """Save document metadata to Supabase"""
         try:
             db_response = supabase.table('documents').insert(doc_data).execute()
+            if doc_data.get('id'):
+                self.invalidate_document(doc_data['id'])
             return bool(db_response.data)
         except Exception as e:
             print(f"Error saving document to Supabase: {e}")
@@ -36,14 +153,13 @@ class DocumentService:
     def upload_file_to_storage(self, file_path: str, storage_path: str) -> bool:
         """Upload file to Supabase Storage"""
         try:
+            # Pass the open file handle so the upload streams from disk instead of loading the whole PDF into memory
             with open(file_path, 'rb') as file:
-                file_data = file.read()
-            
-            storage_response = supabase.storage.from_(SUPABASE_BUCKET).upload(
-                path=storage_path,
-                file=file_data,
-                file_options={"content-type": "application/pdf"}
-            )
+                storage_response = supabase.storage.from_(SUPABASE_BUCKET).upload(
+                    path=storage_path,
+                    file=file,
+                    file_options={"content-type": "application/pdf"}
+                )
             
             # Check if upload was successful
             if hasattr(storage_response, 'data') and storage_response.data:
@@ -75,46 +191,78 @@ class DocumentService:
         except Exception as e:
             print(f"Error cleaning up local file: {e}")
     
-    def get_user_documents(self, user_id: str, session_id: str = None):
-        """Get documents for a user or session"""
+    def get_user_documents(self, user_id: str, session_id: str = None, columns: str = "*"):
+        """Get documents for a user or session (columns: documents fields to select)"""
+        cache_key = (user_id, session_id, columns)
+        with self._docs_cache_lock:
+            documents = self._docs_cache.get(cache_key)
+        if documents is not None:
+            return documents
+        
+        documents = self._fetch_user_documents(user_id, session_id, columns)
+        if documents is not None:
+            with self._docs_cache_lock:
+                self._docs_cache[cache_key] = documents
+        return documents
+    
+    def invalidate_user_documents(self, user_id: str):
+        """Drop cached document listings for a user"""
+        with self._docs_cache_lock:
+            for key in [key for key in self._docs_cache if key[0] == user_id]:
+                self._docs_cache.pop(key, None)
+    
+    def _fetch_user_documents(self, user_id: str, session_id: str = None, columns: str = "*"):
+        """Query documents for a user or session from Supabase in one nested select"""
         try:
+            # Filtering sessions on user_id both scopes the listing and verifies session ownership
+            query = supabase.table('sessions').select(f"id, document_sessions(documents({columns}))").eq('user_id', user_id)
             if session_id:
-                # Get documents for specific session via document_sessions table
-                response = supabase.table('document_sessions').select("documents(*)").eq('session_id', session_id).execute()
-                
-                # Also verify session belongs to user
-                session_check = supabase.table('sessions').select("*").eq('id', session_id).eq('user_id', user_id).execute()
-                if not session_check.data:
-                    return None
-                
-                # Extract documents from the join result
-                documents = []
-                if response.data:
-                    documents = [item['documents'] for item in response.data if item['documents']]
-                return documents
-            else:
-                # Get all documents for user across all sessions
-                user_sessions = supabase.table('sessions').select("id").eq('user_id', user_id).execute()
-                session_ids = [session['id'] for session in user_sessions.data]
-                
-                if session_ids:
-                    # Get documents linked to user's sessions
-                    response = supabase.table('document_sessions').select("documents(*)").in_('session_id', session_ids).execute()
-                    documents = []
-                    if response.data:
-                        documents = [item['documents'] for item in response.data if item['documents']]
-                    return documents
-                else:
-                    return []
+                query = query.eq('id', session_id)
+            response = query.execute()
+            
+            # A requested session that doesn't belong to the user
+            if session_id and not response.data:
+                return None
+            
+            return [
+                link['documents']
+                for session in response.data or []
+                for link in session['document_sessions']
+                if link['documents']
+            ]
             
         except Exception as e:
             print(f"Error getting user documents: {e}")
             return None
     
+    def invalidate_document(self, doc_id: str):
+        """Drop cached rows for a document"""
+        with self._doc_cache_lock:
+            for key in [key for key in self._doc_cache if key[0] == doc_id]:
+                self._doc_cache.pop(key, None)
+    
+    def _cached_document(self, doc_id: str, user_id: Optional[str], fetch) -> Optional[Dict[str, Any]]:
+        """Return a cached document row, calling fetch() on a miss (missing documents are not cached)"""
+        cache_key = (doc_id, user_id)
+        with self._doc_cache_lock:
+            document = self._doc_cache.get(cache_key)
+        if document is not None:
+            return document
+        
+        document = fetch()
+        if document is not None:
+            with self._doc_cache_lock:
+                self._doc_cache[cache_key] = document
+        return document
+    
     def get_document_by_id(self, doc_id: str) -> Dict[str, Any]:
         """Get document by ID"""
+        return self._cached_document(doc_id, None, lambda: self._fetch_document_by_id(doc_id))
+    
+    def _fetch_document_by_id(self, doc_id: str) -> Dict[str, Any]:
+        """Query a document row by ID"""
         try:
-            response = supabase.table('documents').select("*").eq('id', doc_id).execute()
+            response = supabase.table('documents').select(DOCUMENT_FIELDS).eq('id', doc_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             print(f"Error getting document by ID: {e}")
@@ -123,9 +271,13 @@ class DocumentService:
     
     def get_document(self, doc_id: str, user_id: str = None) -> Dict[str, Any]:
         """Get document information from database"""
+        return self._cached_document(doc_id, user_id, lambda: self._fetch_document(doc_id, user_id))
+    
+    def _fetch_document(self, doc_id: str, user_id: str = None) -> Dict[str, Any]:
+        """Query a document and, if user_id is given, check it belongs to that user"""
         try:
             # Query for document in Supabase
-            query = supabase.table('documents').select('*').eq('id', doc_id)
+            query = supabase.table('documents').select(DOCUMENT_FIELDS).eq('id', doc_id)
             response = query.execute()
             
             # Check if document was found
@@ -135,7 +287,7 @@ class DocumentService:
                 # If user_id is provided, verify document is associated with user through document_sessions
                 if user_id:
                     # Check if this document is associated with any session belonging to this user
-                    session_query = supabase.table('document_sessions').select('*') \
+                    session_query = supabase.table('document_sessions').select('session_id') \
                         .eq('document_id', doc_id) \
                         .execute()
                     
@@ -144,7 +296,7 @@ class DocumentService:
                         session_ids = [s['session_id'] for s in session_query.data]
                         
                         # Check if any of these sessions belong to the user
-                        user_sessions = supabase.table('sessions').select('*') \
+                        user_sessions = supabase.table('sessions').select('id') \
                             .in_('id', session_ids) \
                             .eq('user_id', user_id) \
                             .execute()
@@ -169,46 +321,91 @@ class DocumentService:
     
     def delete_document(self, doc_id: str, user_id: str) -> Dict[str, Any]:
         """Delete a document and all its associated data"""
+        if not _is_uuid(doc_id):
+            return {"success": False, "document_found": False, "error": "Document not found or doesn't belong to user"}
         try:
-            # First verify document exists and belongs to user
-            document = self.get_document(doc_id, user_id)
-            if not document:
-                return {"success": False, "error": "Document not found or doesn't belong to user"}
+            # Ownership check and database deletes run in one transaction on the server
+            response = supabase.rpc('delete_document_for_user', {
+                'p_doc_id': doc_id,
+                'p_user_id': user_id
+            }).execute()
+            storage_path = response.data
+            if not storage_path:
+                return {"success": False, "document_found": False, "error": "Document not found or doesn't belong to user"}
             
-            # Delete from RAG pipeline/vector store
             from src.services.rag_pipeline.pipeline import rag_pipeline
-            rag_result = rag_pipeline.delete_document(doc_id, user_id)
-            
-            # Delete from Supabase storage
-            try:
-                storage_path = document.get('storage_path')
-                if storage_path:
-                    supabase.storage.from_(SUPABASE_BUCKET).remove([storage_path])
-            except Exception as e:
-                print(f"Warning: Could not delete from storage: {e}")
             
-            # Delete all document-session links
-            supabase.table('document_sessions').delete().eq('document_id', doc_id).execute()
-            
-            # Delete the document record
-            db_response = supabase.table('documents').delete().eq('id', doc_id).execute()
+            # Storage and vector store deletes are independent, so overlap them
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                storage_future = executor.submit(supabase.storage.from_(SUPABASE_BUCKET).remove, [storage_path])
+                
+                # Delete from RAG pipeline/vector store (a document may have no chunks left)
+                rag_result = rag_pipeline.delete_document(doc_id, user_id)
+                if rag_result["status"] != "success":
+                    print(f"Warning: Could not delete vectors for {doc_id}: {rag_result['message']}")
+                
+                # Delete from Supabase storage
+                try:
+                    storage_future.result()
+                    self.invalidate_signed_url(storage_path)
+                except Exception as e:
+                    print(f"Warning: Could not delete from storage: {e}")
             
             # Clean up status tracking
-            if doc_id in self.document_status:
-                del self.document_status[doc_id]
+            self.clear_document_status(doc_id)
+            self.invalidate_user_documents(user_id)
+            self.invalidate_document(doc_id)
             
             return {
                 "success": True,
                 "message": "Document deleted successfully",
-                "doc_id": doc_id
+                "doc_id": doc_id,
+                "storage_path": storage_path
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return {"success": False, "document_found": True, "error": str(e)}
     
-    def generate_signed_url(self, storage_path: str, expires_in: int = 3600) -> Optional[str]:
-        """Generate a signed URL for a document in Supabase Storage"""
+    def invalidate_signed_url(self, storage_path: str):
+        """Drop cached signed URLs for a storage path"""
+        with self._url_cache_lock:
+            for key in [key for key in self._url_cache if key[0] == storage_path]:
+                self._url_cache.pop(key, None)
+    
+    def _cached_signed_url(self, storage_path: str, expires_in: int) -> Optional[Dict[str, Any]]:
+        """Cached signed URL with the lifetime it has left (call with _url_cache_lock held)"""
+        cached: Optional[Tuple[str, float]] = self._url_cache.get((storage_path, expires_in))
+        if not cached:
+            return None
+        signed_url, expires_at = cached
+        return {"url": signed_url, "expires_in": int(expires_at - time.monotonic())}
+    
+    def _remember_signed_url(self, storage_path: str, expires_in: int, signed_url: str, signed_at: float):
+        """Cache a signed URL with its expiry, if it outlives the cache entry"""
+        if expires_in > settings.SIGNED_URL_CACHE_TTL:
+            with self._url_cache_lock:
+                self._url_cache[(storage_path, expires_in)] = (signed_url, signed_at + expires_in)
+    
+    def generate_signed_url(self, storage_path: str, expires_in: int = settings.SIGNED_URL_EXPIRES_IN) -> Optional[Dict[str, Any]]:
+        """Generate a signed URL for a document in Supabase Storage (cached).
+        
+        Returns {"url", "expires_in"}, where expires_in is the seconds the URL has left.
+        """
+        with self._url_cache_lock:
+            cached = self._cached_signed_url(storage_path, expires_in)
+        if cached:
+            return cached
+        
+        signed_at = time.monotonic()
+        signed_url = self._create_signed_url(storage_path, expires_in)
+        if not signed_url:
+            return None
+        self._remember_signed_url(storage_path, expires_in, signed_url, signed_at)
+        return {"url": signed_url, "expires_in": expires_in}
+    
+    def _create_signed_url(self, storage_path: str, expires_in: int) -> Optional[str]:
+        """Request a signed URL from Supabase Storage"""
         try:
-            # Generate signed URL that expires in 1 hour (3600 seconds)
+            # Generate signed URL that expires after expires_in seconds (default 1 hour)
             response = supabase.storage.from_(SUPABASE_BUCKET).create_signed_url(
                 path=storage_path,
                 expires_in=expires_in
@@ -226,6 +423,39 @@ class DocumentService:
             print(f"Error generating signed URL for {storage_path}: {e}")
             return None
     
+    def generate_signed_urls(self, storage_paths: List[str], expires_in: int = settings.SIGNED_URL_EXPIRES_IN) -> Dict[str, Dict[str, Any]]:
+        """Generate signed URLs for several documents in one Storage request (cached).
+        
+        Returns {"url", "expires_in"} per storage path, like generate_signed_url.
+        """
+        urls = {}
+        with self._url_cache_lock:
+            for path in storage_paths:
+                cached = self._cached_signed_url(path, expires_in)
+                if cached:
+                    urls[path] = cached
+        
+        missing_paths = [path for path in storage_paths if path not in urls]
+        if not missing_paths:
+            return urls
+        
+        try:
+            signed_at = time.monotonic()
+            response = supabase.storage.from_(SUPABASE_BUCKET).create_signed_urls(
+                paths=missing_paths,
+                expires_in=expires_in
+            )
+            
+            for item in response:
+                signed_url = item.get('signedUrl') or item.get('signedURL')
+                if item.get('path') and signed_url and not item.get('error'):
+                    urls[item['path']] = {"url": signed_url, "expires_in": expires_in}
+                    self._remember_signed_url(item['path'], expires_in, signed_url, signed_at)
+            return urls
+        except Exception as e:
+            print(f"Error generating signed URLs: {e}")
+            return urls
+    
     def generate_public_url(self, storage_path: str) -> Optional[str]:
         """Generate a public URL for a document (if bucket is public)"""
         try:
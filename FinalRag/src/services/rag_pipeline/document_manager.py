@@ -1,34 +1,57 @@
 from langchain_core.documents import Document
-import pdfplumber
+import pypdfium2 as pdfium
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
+import chromadb
+from chromadb.config import Settings as ChromaSettings
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
 import shutil
+import threading
+import torch
+from src.core.config import settings
+
+# pdfium is not thread-safe; background-task uploads may extract concurrently
+_pdfium_lock = threading.Lock()
 
 class DocumentManager:
     def __init__(self, persist_directory: str = "./chroma_db"):
         self.persist_directory = persist_directory
-        self.embedding = HuggingFaceEmbeddings(model_name="BAAI/bge-large-en-v1.5")
+        use_cuda = torch.cuda.is_available()
+        model_kwargs = {"device": "cuda" if use_cuda else "cpu"}
+        if settings.EMBEDDING_QUANTIZE and use_cuda:
+            model_kwargs["model_kwargs"] = {"torch_dtype": torch.float16}
+        self.embedding = HuggingFaceEmbeddings(
+            model_name="BAAI/bge-large-en-v1.5",
+            model_kwargs=model_kwargs,
+            # Chunks are embedded in one embed_documents call; larger batches keep the forward pass busy
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
+        )
+        if settings.EMBEDDING_QUANTIZE and not use_cuda:
+            # int8 weights for the Linear layers, which dominate BGE-large's CPU time
+            self.embedding._client = torch.quantization.quantize_dynamic(
+                self.embedding._client, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        # Built once and reused for every upload
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=300, 
+            chunk_overlap=50
+        )
         self.vectordb = None
         self._initialize_db()
     
     def _initialize_db(self):
-        """Initialize or load existing Chroma database"""
-        if os.path.exists(self.persist_directory):
-            # Load existing database
-            self.vectordb = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding
-            )
-        else:
-            # Create new database
-            self.vectordb = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding
-            )
+        """Initialize or load existing Chroma database (PersistentClient creates it if missing)"""
+        self.client = chromadb.PersistentClient(
+            path=self.persist_directory,
+            settings=ChromaSettings(anonymized_telemetry=False)
+        )
+        self.vectordb = Chroma(
+            client=self.client,
+            embedding_function=self.embedding
+        )
     
     def add_document(self, 
                     pdf_path: str, 
@@ -46,28 +69,32 @@ class DocumentManager:
             # loader = PyMuPDFLoader(pdf_path)
             # docs = loader.load()
 
-            # Load and split document using pdfplumber
-            def load_pdf_with_pdfplumber(pdf_path: str):
+            # Load and split document using pdfium (C text extraction, much faster than pdfplumber's pure-Python layout pass)
+            def load_pdf_with_pdfium(pdf_path: str):
                 docs = []
-                with pdfplumber.open(pdf_path) as pdf:
-                    for i, page in enumerate(pdf.pages):
-                        text = page.extract_text() or ""
-                        metadata = {
-                            "page_number": i + 1,
-                            "source": pdf_path
-                        }
-                        docs.append(Document(page_content=text, metadata=metadata))
+                with _pdfium_lock:
+                    pdf = pdfium.PdfDocument(pdf_path)
+                    try:
+                        for i in range(len(pdf)):
+                            page = pdf[i]
+                            textpage = page.get_textpage()
+                            text = textpage.get_text_range() or ""
+                            textpage.close()
+                            page.close()
+                            metadata = {
+                                "page_number": i + 1,
+                                "source": pdf_path
+                            }
+                            docs.append(Document(page_content=text, metadata=metadata))
+                    finally:
+                        pdf.close()
                 return docs
 
             # Load the PDF
-            docs = load_pdf_with_pdfplumber(pdf_path)
+            docs = load_pdf_with_pdfium(pdf_path)
 
             
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=300, 
-                chunk_overlap=50
-            )
-            chunks = splitter.split_documents(docs)
+            chunks = self.splitter.split_documents(docs)
             
             # Add metadata to each chunk
             for i, chunk in enumerate(chunks):
@@ -144,14 +171,15 @@ class DocumentManager:
     def delete_document(self, doc_id: str, user_id: str) -> Dict:
         """Delete a document from the database"""
         try:
-            # Get document chunks to delete
+            # Get document chunk ids to delete (include=[] skips loading chunk text and metadata)
             results = self.vectordb.get(
                 where={
                     "$and": [
                         {"user_id": {"$eq": user_id}},
                         {"doc_id": {"$eq": doc_id}}
                     ]
-                }
+                },
+                include=[]
             )
             
             if not results['ids']:
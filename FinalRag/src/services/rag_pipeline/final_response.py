@@ -1,22 +1,15 @@
+import re
 from typing import List, Dict, Any
+from langchain_core.messages import SystemMessage
 
-def generate_final_response(enriched_query: str, scaled_result: Any, llm) -> str:
-    """
-    Generate final response using enriched query, and scaled result.
-    
-    Args:
-        enriched_query: The enriched/processed query
-        scaled_result: The scaled result from phase 2 processing
-        llm: The LLM instance to use for generation
-        
-    Returns:
-        str: Final response text or error message
-    """
-    try:
-        print("DEBUG: Starting generate_final_response...")
-                
-        # Create the prompt for final response generation
-        prompt = f"""
+# Simple "what is the X?" lookups, answered from a template instead of an LLM call
+LOOKUP_QUERY_PATTERN = re.compile(
+    r"^\s*what\s+(?P<verb>is|was|are|were)\s+(?:the\s+)?(?P<subject>[^?\n]{1,80}?)\s*\??\s*$",
+    re.IGNORECASE
+)
+
+# Prompt templates are built once; only the query and result are filled in per call
+FINAL_PROMPT_TEMPLATE = """
 USER QUERY: {enriched_query}
 
 CALCULATED RESULT: {scaled_result}
@@ -30,32 +23,8 @@ INSTRUCTIONS:
 
 Generate a final response that combines the calculated result to answer the user's query:
 """
-        
-        print(f"DEBUG: Prompt length: {len(prompt)} characters")
-        print(f"DEBUG: About to invoke LLM with llm type: {type(llm)}")
-        
-        # Generate response using LLM
-        response = llm.invoke(prompt)
-        print(f"DEBUG: LLM response received, type: {type(response)}")
-        
-        final_text = response.content.strip() if hasattr(response, 'content') else str(response).strip()
-        print(f"DEBUG: Final text length: {len(final_text)} characters")
-        
-        # Check if response is empty
-        if not final_text:
-            return "Final response generation failed: LLM returned empty response"
-        
-        return final_text
-        
-    except Exception as e:
-        print(f"DEBUG: Exception in generate_final_response: {e}")
-        print(f"DEBUG: Exception type: {type(e)}")
-        return f"Final response generation failed: {str(e)}"
-
 
-def generate_direct_response(enriched_query: str, unmasked_result: str, llm) -> str:
-    try:
-        prompt = f"""
+DIRECT_PROMPT_TEMPLATE = """
 You are a helpful assistant that provides direct answers from the given context.
  
 USER QUERY: {enriched_query}
@@ -75,15 +44,51 @@ INSTRUCTIONS:
 
 Remember: Your response should contain real numerical values, not masked variable names like MONEY_1, PERCENT_1, etc.
 """
-        # Convert to LangChain message format for better handling
-        from langchain_core.messages import SystemMessage, HumanMessage
-       
-        langchain_messages = [
-            SystemMessage(content=prompt)
-        ]
-       
+
+def generate_final_response(enriched_query: str, scaled_result: Any, llm) -> str:
+    """
+    Generate final response using enriched query, and scaled result.
+    
+    Args:
+        enriched_query: The enriched/processed query
+        scaled_result: The scaled result from phase 2 processing
+        llm: The LLM instance to use for generation
+        
+    Returns:
+        str: Final response text or error message
+    """
+    try:
+        # Fast path: a plain number answering a simple lookup needs no LLM to phrase it.
+        # The number is written as-is so the pipeline can still swap in the unscaled value.
+        match = LOOKUP_QUERY_PATTERN.match(enriched_query)
+        if match and isinstance(scaled_result, (int, float)) and not isinstance(scaled_result, bool):
+            return f"The {match.group('subject')} {match.group('verb').lower()} {scaled_result}."
+        
+        # Create the prompt for final response generation
+        prompt = FINAL_PROMPT_TEMPLATE.format(enriched_query=enriched_query, scaled_result=scaled_result)
+        
+        # Generate response using LLM
+        response = llm.invoke(prompt)
+        
+        final_text = response.content.strip() if hasattr(response, 'content') else str(response).strip()
+        
+        # Check if response is empty
+        if not final_text:
+            return "Final response generation failed: LLM returned empty response"
+        
+        return final_text
+        
+    except Exception as e:
+        print(f"Error in generate_final_response: {e}")
+        return f"Final response generation failed: {str(e)}"
+
+
+def generate_direct_response(enriched_query: str, unmasked_result: str, llm) -> str:
+    try:
+        prompt = DIRECT_PROMPT_TEMPLATE.format(enriched_query=enriched_query, unmasked_result=unmasked_result)
+        
         # Generate response using LLM
-        response = llm.invoke(langchain_messages)
+        response = llm.invoke([SystemMessage(content=prompt)])
         final_text = response.content.strip() if hasattr(response, 'content') else str(response).strip()
        
         if not final_text:
@@ -3,8 +3,9 @@
 import json
 import re
 import ast
-import operator
+import functools
 import sqlite3
+import threading
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
@@ -27,47 +28,44 @@ class FunctionMetadata:
 # -----------------------------
 # Safe Expression Evaluator
 # -----------------------------
-class SafeFormulaEvaluator(ast.NodeVisitor):
+# Normalization patterns used by process_request, compiled once
+_RE_NONWORD = re.compile(r'[^a-zA-Z0-9_]')
+_RE_WS = re.compile(r'\s+')
+_RE_FORMULA_DISALLOWED = re.compile(r'[^a-zA-Z0-9_()+\-*/.]')
+ 
+# Node types a formula may contain: arithmetic on variables and numbers only
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd,
+)
+ 
+@functools.lru_cache(maxsize=1024)
+def _compile_formula(expr: str) -> Tuple[Any, Tuple[str, ...]]:
+    """Validate a formula once and compile it to a code object, with the variable names it reads"""
+    tree = ast.parse(expr, mode='eval')
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"Unsupported expression: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+    names = tuple({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)})
+    return compile(tree, '<formula>', 'eval'), names
+ 
+class SafeFormulaEvaluator:
     def __init__(self, variables: Dict[str, float]):
         self.variables = variables
-        self.ops = {
-            ast.Add: operator.add,
-            ast.Sub: operator.sub,
-            ast.Mult: operator.mul,
-            ast.Div: operator.truediv,
-            ast.Pow: operator.pow,
-        }
- 
-    def visit_BinOp(self, node):
-        left = self.visit(node.left)
-        right = self.visit(node.right)
-        op = self.ops[type(node.op)]
-        return op(left, right)
- 
-    def visit_Name(self, node):
-        var = node.id.lower().strip("_")
-        if var not in self.variables:
-            raise ValueError(f"Unknown variable: {var}")
-        return self.variables[var]
- 
-    def visit_Constant(self, node):
-        return node.value
- 
-    def visit_Num(self, node):
-        return node.n
- 
-    def visit_Expr(self, node):
-        return self.visit(node.value)
- 
-    def visit_Module(self, node):
-        return self.visit(node.body[0])
- 
-    def visit_Expression(self, node):
-        return self.visit(node.body)
  
     def evaluate(self, expr: str) -> float:
-        parsed_expr = ast.parse(expr, mode='eval')
-        return self.visit(parsed_expr.body)
+        code, names = _compile_formula(expr)
+        # Formula names match data points case-insensitively, ignoring surrounding underscores
+        scope = {}
+        for name in names:
+            var = name.lower().strip("_")
+            if var not in self.variables:
+                raise ValueError(f"Unknown variable: {var}")
+            scope[name] = self.variables[var]
+        # The tree was checked against _ALLOWED_NODES, so the code can only do arithmetic
+        return eval(code, {"__builtins__": {}}, scope)
  
 # -----------------------------
 # Database to store functions
@@ -75,51 +73,84 @@ class SafeFormulaEvaluator(ast.NodeVisitor):
 class FunctionDatabase:
     def __init__(self, db_path: str = "function4.db"):
         self.db_path = db_path
+        # One long-lived connection keeps SQLite's page cache warm between calls
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        for pragma in (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA temp_store=MEMORY",
+            "PRAGMA cache_size=-20000",
+        ):
+            self._conn.execute(pragma)
         self.init_database()
  
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS functions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            function_name TEXT UNIQUE,
-            formula TEXT,
-            parameters TEXT,
-            parameter_types TEXT,
-            aliases TEXT,
-            created_at TEXT,
-            last_modified TEXT,
-            usage_count INTEGER DEFAULT 0
-        )''')
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS functions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                function_name TEXT UNIQUE,
+                formula TEXT,
+                parameters TEXT,
+                parameter_types TEXT,
+                aliases TEXT,
+                created_at TEXT,
+                last_modified TEXT,
+                usage_count INTEGER DEFAULT 0
+            )''')
+            # Lowercased aliases, indexed so find_by_alias doesn't scan and parse every row
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS function_aliases (
+                alias_lower TEXT,
+                function_name TEXT REFERENCES functions(function_name)
+            )''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_function_aliases_alias ON function_aliases(alias_lower)')
+            # Backfill aliases for databases created before the alias table existed
+            if cursor.execute('SELECT 1 FROM function_aliases LIMIT 1').fetchone() is None:
+                cursor.executemany(
+                    'INSERT INTO function_aliases (alias_lower, function_name) VALUES (?, ?)',
+                    [
+                        (alias.lower(), function_name)
+                        for function_name, aliases in cursor.execute('SELECT function_name, aliases FROM functions').fetchall()
+                        for alias in json.loads(aliases)
+                    ]
+                )
+            self._conn.commit()
  
     def save_function(self, metadata: FunctionMetadata):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT OR REPLACE INTO functions
-        (function_name, formula, parameters, parameter_types, aliases, created_at, last_modified, usage_count)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', (
-            metadata.function_name,
-            metadata.formula,
-            json.dumps(metadata.parameters),
-            json.dumps(metadata.parameter_types),
-            json.dumps(metadata.aliases),
-            metadata.created_at,
-            metadata.last_modified,
-            metadata.usage_count
-        ))
-        conn.commit()
-        conn.close()
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+            INSERT OR REPLACE INTO functions
+            (function_name, formula, parameters, parameter_types, aliases, created_at, last_modified, usage_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', (
+                metadata.function_name,
+                metadata.formula,
+                json.dumps(metadata.parameters),
+                json.dumps(metadata.parameter_types),
+                json.dumps(metadata.aliases),
+                metadata.created_at,
+                metadata.last_modified,
+                metadata.usage_count
+            ))
+            cursor.execute('DELETE FROM function_aliases WHERE function_name = ?', (metadata.function_name,))
+            cursor.executemany(
+                'INSERT INTO function_aliases (alias_lower, function_name) VALUES (?, ?)',
+                [(alias.lower(), metadata.function_name) for alias in metadata.aliases]
+            )
+            self._conn.commit()
+ 
+    def increment_usage(self, function_name: str):
+        """Bump a function's usage count without rewriting the whole row"""
+        with self._lock:
+            self._conn.execute('UPDATE functions SET usage_count = usage_count + 1 WHERE function_name = ?', (function_name,))
+            self._conn.commit()
  
     def get_function(self, function_name: str) -> Optional[FunctionMetadata]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM functions WHERE function_name = ?', (function_name,))
-        result = cursor.fetchone()
-        conn.close()
+        with self._lock:
+            result = self._conn.execute('SELECT * FROM functions WHERE function_name = ?', (function_name,)).fetchone()
         if result:
             return FunctionMetadata(
                 function_name=result[1],
@@ -134,32 +165,28 @@ class FunctionDatabase:
         return None
  
     def find_by_alias(self, alias: str) -> Optional[FunctionMetadata]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM functions')
-        results = cursor.fetchall()
-        conn.close()
-        for result in results:
-            aliases = json.loads(result[5])
-            if alias.lower() in [a.lower() for a in aliases]:
-                return FunctionMetadata(
-                    function_name=result[1],
-                    formula=result[2],
-                    parameters=json.loads(result[3]),
-                    parameter_types=json.loads(result[4]),
-                    aliases=json.loads(result[5]),
-                    created_at=result[6],
-                    last_modified=result[7],
-                    usage_count=result[8]
-                )
+        with self._lock:
+            result = self._conn.execute('''
+            SELECT f.* FROM functions f
+            JOIN function_aliases a ON a.function_name = f.function_name
+            WHERE a.alias_lower = ?
+            ORDER BY f.id LIMIT 1''', (alias.lower(),)).fetchone()
+        if result:
+            return FunctionMetadata(
+                function_name=result[1],
+                formula=result[2],
+                parameters=json.loads(result[3]),
+                parameter_types=json.loads(result[4]),
+                aliases=json.loads(result[5]),
+                created_at=result[6],
+                last_modified=result[7],
+                usage_count=result[8]
+            )
         return None
  
     def get_all_functions(self) -> List[FunctionMetadata]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM functions')
-        results = cursor.fetchall()
-        conn.close()
+        with self._lock:
+            results = self._conn.execute('SELECT * FROM functions').fetchall()
         functions = []
         for result in results:
             functions.append(FunctionMetadata(
@@ -180,7 +207,9 @@ class FunctionDatabase:
 class SemanticMatcher:
     @staticmethod
     def similarity_score(str1: str, str2: str) -> float:
-        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+        a, b = str1.lower(), str2.lower()
+        # autojunk would discard frequent characters in longer strings and under-score repetitive names
+        return 1.0 if a == b else SequenceMatcher(None, a, b, autojunk=False).ratio()
  
 # -----------------------------
 # Agentic Formula Processor
@@ -202,11 +231,11 @@ class AgenticFormulaProcessor:
         data_points = sample_input['data_points']
  
         normalized_data = {
-            re.sub(r'[^a-zA-Z0-9_]', '', k.lower().replace(' ', '_')).strip('_'): v
+            _RE_NONWORD.sub('', k.lower().replace(' ', '_')).strip('_'): v
             for k, v in data_points.items()
         }
-        normalized_formula = re.sub(r'\s+', '_', formula_str.split('=')[-1].strip().lower())
-        normalized_formula = re.sub(r'[^a-zA-Z0-9_()+\-*/.]', '', normalized_formula).strip("_")
+        normalized_formula = _RE_WS.sub('_', formula_str.split('=')[-1].strip().lower())
+        normalized_formula = _RE_FORMULA_DISALLOWED.sub('', normalized_formula).strip("_")
  
         existing_function = self._find_existing_function(function_name)
  
@@ -224,8 +253,7 @@ class AgenticFormulaProcessor:
                 try:
                     evaluator = SafeFormulaEvaluator(normalized_data)
                     result = evaluator.evaluate(normalized_formula)
-                    existing_function.usage_count += 1
-                    self.db.save_function(existing_function)
+                    self.db.increment_usage(existing_function.function_name)
                     return {
                         "status": "success",
                         "result": result,
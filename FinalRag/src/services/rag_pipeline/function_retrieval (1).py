@@ -1,10 +1,42 @@
+import ast
+import functools
 import json
+import os
 import re
 from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from difflib import SequenceMatcher
 import sqlite3
 from datetime import datetime
+from rapidfuzz import fuzz, process
+
+# Functions a formula may call, e.g. sum(miscellaneous_income) for array parameters
+FORMULA_FUNCTIONS = {
+    "abs": abs, "min": min, "max": max, "sum": sum,
+    "round": round, "pow": pow,
+    "avg": lambda values: sum(values) / len(values),
+}
+
+# Arithmetic, numbers, variables and calls to FORMULA_FUNCTIONS - nothing else compiles
+_ALLOWED_FORMULA_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+)
+
+@functools.lru_cache(maxsize=1024)
+def _compile_formula(formula: str):
+    """Parse, validate and compile a formula once; reused functions skip straight to evaluation"""
+    tree = ast.parse(formula, mode='eval')
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_FORMULA_NODES):
+            raise ValueError(f"Unsupported expression: {type(node).__name__}")
+        if isinstance(node, ast.Call) and (
+            not isinstance(node.func, ast.Name) or node.func.id not in FORMULA_FUNCTIONS or node.keywords
+        ):
+            raise ValueError(f"Unsupported function call in formula: {ast.unparse(node)}")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+    return compile(tree, '<formula>', 'eval')
 
 @dataclass
 class FunctionMetadata:
@@ -20,6 +52,10 @@ class FunctionMetadata:
 class FunctionDatabase:
     def __init__(self, db_path: str = "functions.db"):
         self.db_path = db_path
+        # In-memory index of the functions table, reloaded when another process changes the file
+        self._by_name: Dict[str, FunctionMetadata] = {}  # in table order
+        self._by_alias: Dict[str, str] = {}  # lowercased alias -> function name
+        self._loaded_mtime = None
         self.init_database()
     
     def init_database(self):
@@ -44,8 +80,54 @@ class FunctionDatabase:
         conn.commit()
         conn.close()
     
+    @staticmethod
+    def _copy(metadata: FunctionMetadata) -> FunctionMetadata:
+        """Copy with fresh containers, so callers can't mutate the index behind a save"""
+        return replace(
+            metadata,
+            parameters=list(metadata.parameters),
+            parameter_types=dict(metadata.parameter_types),
+            aliases=list(metadata.aliases)
+        )
+    
+    def _rebuild_aliases(self):
+        """Map each alias to the first function in table order that lists it"""
+        self._by_alias = {}
+        for function in self._by_name.values():
+            for alias in function.aliases:
+                self._by_alias.setdefault(alias.lower(), function.function_name)
+    
+    def _ensure_loaded(self):
+        """Load all functions once, and again whenever the database file changed underneath us"""
+        mtime = os.stat(self.db_path).st_mtime_ns
+        if mtime == self._loaded_mtime:
+            return
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM functions ORDER BY id')
+        results = cursor.fetchall()
+        conn.close()
+        
+        self._by_name = {}
+        for result in results:
+            self._by_name[result[1]] = FunctionMetadata(
+                function_name=result[1],
+                formula=result[2],
+                parameters=json.loads(result[3]),
+                parameter_types=json.loads(result[4]),
+                aliases=json.loads(result[5]),
+                created_at=result[6],
+                last_modified=result[7],
+                usage_count=result[8]
+            )
+        self._rebuild_aliases()
+        self._loaded_mtime = mtime
+    
     def save_function(self, metadata: FunctionMetadata):
         """Save function metadata to database"""
+        self._ensure_loaded()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -66,75 +148,29 @@ class FunctionDatabase:
         
         conn.commit()
         conn.close()
+        
+        # INSERT OR REPLACE gives the row a new id, so the function moves to the end
+        self._by_name.pop(metadata.function_name, None)
+        self._by_name[metadata.function_name] = self._copy(metadata)
+        self._rebuild_aliases()
+        self._loaded_mtime = os.stat(self.db_path).st_mtime_ns
     
     def get_function(self, function_name: str) -> Optional[FunctionMetadata]:
         """Retrieve function metadata from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM functions WHERE function_name = ?', (function_name,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return FunctionMetadata(
-                function_name=result[1],
-                formula=result[2],
-                parameters=json.loads(result[3]),
-                parameter_types=json.loads(result[4]),
-                aliases=json.loads(result[5]),
-                created_at=result[6],
-                last_modified=result[7],
-                usage_count=result[8]
-            )
-        return None
+        self._ensure_loaded()
+        function = self._by_name.get(function_name)
+        return self._copy(function) if function else None
     
     def find_by_alias(self, alias: str) -> Optional[FunctionMetadata]:
         """Find function by alias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM functions')
-        results = cursor.fetchall()
-        conn.close()
-        
-        for result in results:
-            aliases = json.loads(result[5])
-            if alias.lower() in [a.lower() for a in aliases]:
-                return FunctionMetadata(
-                    function_name=result[1],
-                    formula=result[2],
-                    parameters=json.loads(result[3]),
-                    parameter_types=json.loads(result[4]),
-                    aliases=json.loads(result[5]),
-                    created_at=result[6],
-                    last_modified=result[7],
-                    usage_count=result[8]
-                )
-        return None
+        self._ensure_loaded()
+        function_name = self._by_alias.get(alias.lower())
+        return self._copy(self._by_name[function_name]) if function_name else None
     
     def get_all_functions(self) -> List[FunctionMetadata]:
         """Get all functions from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM functions')
-        results = cursor.fetchall()
-        conn.close()
-        
-        functions = []
-        for result in results:
-            functions.append(FunctionMetadata(
-                function_name=result[1],
-                formula=result[2],
-                parameters=json.loads(result[3]),
-                parameter_types=json.loads(result[4]),
-                aliases=json.loads(result[5]),
-                created_at=result[6],
-                last_modified=result[7],
-                usage_count=result[8]
-            ))
-        return functions
+        self._ensure_loaded()
+        return [self._copy(function) for function in self._by_name.values()]
 
 class FormulaParser:
     @staticmethod
@@ -162,7 +198,9 @@ class SemanticMatcher:
     @staticmethod
     def similarity_score(str1: str, str2: str) -> float:
         """Calculate similarity between two strings"""
-        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+        a, b = str1.lower(), str2.lower()
+        # autojunk would discard frequent characters in longer strings and under-score repetitive names
+        return 1.0 if a == b else SequenceMatcher(None, a, b, autojunk=False).ratio()
     
     @staticmethod
     def find_parameter_mappings(input_params: List[str], stored_params: List[str], threshold: float = 0.6) -> Dict[str, str]:
@@ -238,16 +276,13 @@ class AgenticFormulaProcessor:
         
         # Try semantic similarity with all functions
         all_functions = self.db.get_all_functions()
+        # Score every name and alias in native code; the first function to claim a name wins
+        choices = {}
         for func in all_functions:
-            if self.matcher.similarity_score(function_name, func.function_name) > 0.8:
-                return func
-            
-            # Check if any alias is similar
-            for alias in func.aliases:
-                if self.matcher.similarity_score(function_name, alias) > 0.8:
-                    return func
-        
-        return None
+            for name in (func.function_name, *func.aliases):
+                choices.setdefault(name.lower(), func)
+        match = process.extractOne(function_name.lower(), list(choices), scorer=fuzz.ratio, score_cutoff=80)
+        return choices[match[0]] if match else None
     
     def _handle_existing_function(self, existing_function: FunctionMetadata, sample_input: Dict[str, Any]) -> Dict[str, Any]:
         """Handle cases where function already exists"""
@@ -377,32 +412,10 @@ class AgenticFormulaProcessor:
     def _evaluate_formula(self, formula: str, data_points: Dict[str, Any]) -> float:
         """Safely evaluate the formula with given data points"""
         try:
-            # Replace variables in formula with actual values
-            working_formula = formula
-            
-            for param, value in data_points.items():
-                if isinstance(value, list):
-                    # Handle array parameters
-                    if f'sum({param})' in working_formula:
-                        working_formula = working_formula.replace(f'sum({param})', str(sum(value)))
-                    elif f'avg({param})' in working_formula:
-                        working_formula = working_formula.replace(f'avg({param})', str(sum(value) / len(value)))
-                    elif f'max({param})' in working_formula:
-                        working_formula = working_formula.replace(f'max({param})', str(max(value)))
-                    elif f'min({param})' in working_formula:
-                        working_formula = working_formula.replace(f'min({param})', str(min(value)))
-                else:
-                    # Handle scalar parameters
-                    working_formula = working_formula.replace(param, str(value))
-            
-            # Safe evaluation (restricted to basic math operations)
-            allowed_names = {
-                "__builtins__": {},
-                "abs": abs, "min": min, "max": max, "sum": sum,
-                "round": round, "pow": pow
-            }
-            
-            result = eval(working_formula, allowed_names, {})
+            # Variables are bound by name, so overlapping names like tax/taxes can't clobber each other;
+            # array parameters stay lists for sum()/avg()/max()/min() to reduce
+            code = _compile_formula(formula)
+            result = eval(code, {"__builtins__": {}, **FORMULA_FUNCTIONS}, dict(data_points))
             return float(result)
         
         except Exception as e:
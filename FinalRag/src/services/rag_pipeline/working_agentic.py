@@ -304,7 +304,9 @@ class AgenticFormulaSystem:
 
     def _calculate_similarity(self, str1: str, str2: str) -> float:
         """Calculate similarity score between two strings"""
-        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+        a, b = str1.lower(), str2.lower()
+        # autojunk would discard frequent characters in longer strings and under-score repetitive formulas
+        return 1.0 if a == b else SequenceMatcher(None, a, b, autojunk=False).ratio()
 
     def _find_similar_functions(self, formula: str, threshold: float = 0.85) -> List[Dict[str, Any]]:
         """Find functions with similar formulas"""
@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from cachetools import TTLCache
+from src.core.config import settings
+from src.db.redis_client import redis_client
+
+# Per-document invalidation counters, shared by every worker through Redis
+GENERATION_KEY_PREFIX = "semcache-gen:"
+
+# Words and numbers (years, amounts, percentages) in a query
+_TERM_PATTERN = re.compile(r"\d+(?:[.,]\d+)*%?|[a-z]+")
+# Filler words a paraphrase may add, drop or reorder without changing what is asked
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "what", "whats", "which", "how", "was", "were", "is", "are", "be", "been",
+    "did", "does", "do", "has", "have", "had", "in", "of", "for", "to", "on", "at", "by", "during",
+    "from", "about", "as", "and", "with", "me", "tell", "show", "give", "please", "i", "we", "you",
+    "it", "its", "this", "that", "there", "s",
+})
+
+def _query_terms(query: str) -> frozenset:
+    """Content words and numbers that decide what a query asks for"""
+    return frozenset(term for term in _TERM_PATTERN.findall(query.lower()) if term not in _FILLER_WORDS)
+
+class SemanticCache:
+    """Answer cache for near-identical queries over the same set of documents.
+    
+    Entries are bucketed by (user_id, doc_ids, k) so a hit never crosses document sets.
+    Within a bucket, random-projection LSH narrows the candidates before an exact cosine check.
+    Embeddings of financial questions that differ only in a year or a metric ("revenue in 2022"
+    vs "revenue in 2023", "net income" vs "operating income") are nearly identical, so a semantic
+    hit also requires the same numbers and content words - only word order and filler may differ.
+    Exact repeats of a query are answered from a plain dict lookup without embedding it.
+    With Redis configured, bucket keys also carry each document's invalidation counter, so
+    invalidate_document() in one worker retires the entries cached by all the others.
+    """
+    
+    def __init__(self, embed: Callable[[str], List[float]], num_bits: int = 8, num_tables: int = 16):
+        self.embed = embed
+        self.num_bits = num_bits
+        self.num_tables = num_tables
+        self._planes = None  # Created on first use, once the embedding dimension is known
+        self._buckets = TTLCache(maxsize=settings.SEMANTIC_CACHE_MAX_BUCKETS, ttl=settings.SEMANTIC_CACHE_TTL)
+        # Results keyed on (bucket key, query text) for exact repeats
+        self._exact = TTLCache(maxsize=settings.EXACT_CACHE_SIZE, ttl=settings.EXACT_CACHE_TTL)
+        # Recent query embeddings, so a miss followed by store() embeds the query only once
+        self._embeddings = TTLCache(maxsize=1024, ttl=300)
+        self._lock = threading.Lock()
+    
+    def _bucket_key(self, user_id: str, doc_ids: List[str], k: int) -> Optional[tuple]:
+        """Cache key for a document set, or None if the invalidation counters can't be read"""
+        doc_ids = tuple(sorted(doc_ids))
+        if redis_client is None or not doc_ids:
+            return (user_id, doc_ids, k, ())
+        try:
+            generations = redis_client.mget([f"{GENERATION_KEY_PREFIX}{doc_id}" for doc_id in doc_ids])
+        except Exception as e:
+            # Without the counters a hit could be stale, so skip the cache
+            print(f"Error reading semantic cache generations: {e}")
+            return None
+        return (user_id, doc_ids, k, tuple(generations))
+    
+    def _embed(self, query: str) -> np.ndarray:
+        """Normalized query embedding (cosine similarity becomes a dot product)"""
+        with self._lock:
+            vector = self._embeddings.get(query)
+        if vector is not None:
+            return vector
+        
+        vector = np.asarray(self.embed(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        with self._lock:
+            self._embeddings[query] = vector
+        return vector
+    
+    def _signatures(self, vector: np.ndarray) -> List[int]:
+        """LSH signature per table: one bit per random hyperplane (call with the lock held)"""
+        if self._planes is None:
+            rng = np.random.default_rng(0)
+            self._planes = rng.standard_normal((self.num_tables, self.num_bits, vector.shape[0])).astype(np.float32)
+        bits = (self._planes @ vector) > 0
+        return (bits.astype(np.uint32) << np.arange(self.num_bits, dtype=np.uint32)).sum(axis=1).tolist()
+    
+    def _quantize(self, vector: np.ndarray) -> tuple:
+        """int8 copy of a normalized embedding plus its scale (a quarter of the float32 size)"""
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+    
+    def _scores(self, entries: List[Dict[str, Any]], vector: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of a normalized query to each entry, computed in integers.
+        
+        The query is quantized like the entries and the int8 dot products accumulate in int32
+        (einsum casts in small buffers), so no float32 copy of the candidates is made.
+        """
+        query, query_scale = self._quantize(vector)
+        dots = np.einsum("ij,j->i", np.stack([entry["embedding"] for entry in entries]), query, dtype=np.int32)
+        scales = np.array([entry["scale"] for entry in entries], dtype=np.float32)
+        return dots * scales * query_scale
+    
+    def _new_bucket(self) -> Dict[str, Any]:
+        return {"entries": [], "tables": [{} for _ in range(self.num_tables)]}
+    
+    def _add_entry(self, bucket: Dict[str, Any], entry: Dict[str, Any]):
+        index = len(bucket["entries"])
+        bucket["entries"].append(entry)
+        for table, signature in zip(bucket["tables"], entry["signatures"]):
+            table.setdefault(signature, []).append(index)
+    
+    def lookup(self, query: str, user_id: str, doc_ids: List[str], k: int) -> Optional[Dict[str, Any]]:
+        """Return a cached pipeline result for a near-identical query, or None"""
+        key = self._bucket_key(user_id, doc_ids, k)
+        if key is None:
+            return None
+        with self._lock:
+            result = self._exact.get((key, query))
+        if result is not None:
+            return result
+        
+        vector = self._embed(query)
+        now = time.monotonic()
+        
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return None
+            
+            candidates = set()
+            for table, signature in zip(bucket["tables"], self._signatures(vector)):
+                candidates.update(table.get(signature, ()))
+            
+            terms = _query_terms(query)
+            entries = [
+                bucket["entries"][index] for index in candidates
+                if now - bucket["entries"][index]["created"] <= settings.SEMANTIC_CACHE_TTL
+                and bucket["entries"][index]["terms"] == terms
+            ]
+            if not entries:
+                return None
+            
+            scores = self._scores(entries, vector)
+            best = int(scores.argmax())
+            if scores[best] < settings.SEMANTIC_CACHE_THRESHOLD:
+                return None
+            # The answer is reused, but it was asked as this query
+            return {**entries[best]["result"], "original_query": query}
+    
+    def store(self, query: str, user_id: str, doc_ids: List[str], k: int, result: Dict[str, Any]):
+        """Cache a successful pipeline result for this query and document set"""
+        key = self._bucket_key(user_id, doc_ids, k)
+        if key is None:
+            return
+        vector = self._embed(query)
+        now = time.monotonic()
+        
+        with self._lock:
+            self._exact[(key, query)] = result
+            bucket = self._buckets.get(key) or self._new_bucket()
+            
+            if len(bucket["entries"]) >= settings.SEMANTIC_CACHE_MAX_ENTRIES:
+                # Rebuild with the newest unexpired half
+                keep = [
+                    entry for entry in bucket["entries"][-(settings.SEMANTIC_CACHE_MAX_ENTRIES // 2):]
+                    if now - entry["created"] <= settings.SEMANTIC_CACHE_TTL
+                ]
+                bucket = self._new_bucket()
+                for entry in keep:
+                    self._add_entry(bucket, entry)
+            
+            embedding, scale = self._quantize(vector)
+            self._add_entry(bucket, {
+                "embedding": embedding,
+                "scale": scale,
+                "signatures": self._signatures(vector),
+                "terms": _query_terms(query),
+                "result": result,
+                "created": now
+            })
+            # Re-assigning refreshes the bucket's TTL
+            self._buckets[key] = bucket
+    
+    def invalidate_document(self, doc_id: str):
+        """Drop cached answers for every document set that includes doc_id, in every worker"""
+        if redis_client is not None:
+            # Bumping the counter changes the bucket key other workers compute for this document.
+            # It outlives every entry cached under the old value, so it can safely expire.
+            generation_key = f"{GENERATION_KEY_PREFIX}{doc_id}"
+            try:
+                with redis_client.pipeline() as pipe:
+                    pipe.incr(generation_key)
+                    pipe.expire(generation_key, settings.SEMANTIC_CACHE_TTL * 2)
+                    pipe.execute()
+            except Exception as e:
+                print(f"Error invalidating semantic cache for {doc_id}: {e}")
+        
+        with self._lock:
+            for key in [key for key in self._buckets if doc_id in key[1]]:
+                self._buckets.pop(key, None)
+            for key in [key for key in self._exact if doc_id in key[0][1]]:
+                self._exact.pop(key, None)
+
+def _embed_query(query: str) -> List[float]:
+    # Imported on first use so the cache doesn't load the embedding model at import time
+    from src.services.rag_pipeline.document_manager import document_manager
+    return document_manager.embedding.embed_query(query)
+
+# Global instance, sharing the embedding model used for retrieval
+semantic_cache = SemanticCache(_embed_query)
@@ -1,15 +1,32 @@
-import uuid
+import threading
+from cachetools import TTLCache
 from datetime import datetime
 from typing import Dict, Any, List
+from postgrest.exceptions import APIError
 from src.db.supabase_client import supabase
+from src.core.config import settings
+
+# Postgres invalid_text_representation - raised when a malformed id is cast to UUID
+INVALID_ID_CODE = "22P02"
 
 class SessionService:
+    def __init__(self):
+        # Short-lived cache of session listings keyed on user_id
+        self._sessions_cache = TTLCache(maxsize=settings.LIST_CACHE_SIZE, ttl=settings.LIST_CACHE_TTL)
+        self._sessions_cache_lock = threading.Lock()
+        # (session_id, user_id) pairs recently verified as valid
+        self._verified_cache = TTLCache(maxsize=50_000, ttl=settings.LIST_CACHE_TTL)
+    
+    def invalidate_user_sessions(self, user_id: str):
+        """Drop the cached session listing for a user"""
+        with self._sessions_cache_lock:
+            self._sessions_cache.pop(user_id, None)
+    
     def create_session(self, user_id: str, name: str = None) -> Dict[str, Any]:
         """Create a new chat session"""
         try:
-            session_id = str(uuid.uuid4())
+            # id is generated by Postgres (gen_random_uuid) and returned with the inserted row
             session_data = {
-                "id": session_id,
                 "user_id": user_id,
                 "created_at": datetime.now().isoformat(),
                 "name": name
@@ -18,9 +35,10 @@ class SessionService:
             response = supabase.table('sessions').insert(session_data).execute()
             
             if response.data:
+                self.invalidate_user_sessions(user_id)
                 return {
                     "success": True,
-                    "session_id": session_id,
+                    "session_id": response.data[0]["id"],
                     "user_id": user_id,
                     "created_at": session_data["created_at"]
                 }
@@ -31,22 +49,39 @@ class SessionService:
     
     def get_user_sessions(self, user_id: str) -> Dict[str, Any]:
         """Get all sessions for a user"""
+        with self._sessions_cache_lock:
+            cached = self._sessions_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
             response = supabase.table('sessions').select("*").eq('user_id', user_id).order('created_at', desc=True).execute()
             
-            return {
+            result = {
                 "success": True,
                 "sessions": response.data,
                 "total_sessions": len(response.data)
             }
+            with self._sessions_cache_lock:
+                self._sessions_cache[user_id] = result
+            return result
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def verify_session(self, session_id: str, user_id: str) -> bool:
-        """Verify that a session exists and belongs to the user"""
+        """Verify that a session exists and belongs to the user (valid results are cached briefly)"""
+        cache_key = (session_id, user_id)
+        with self._sessions_cache_lock:
+            if cache_key in self._verified_cache:
+                return True
+        
         try:
-            session_check = supabase.table('sessions').select("*").eq('id', session_id).eq('user_id', user_id).execute()
-            return bool(session_check.data)
+            session_check = supabase.table('sessions').select("id").eq('id', session_id).eq('user_id', user_id).execute()
+            if session_check.data:
+                with self._sessions_cache_lock:
+                    self._verified_cache[cache_key] = True
+                return True
+            return False
         except Exception as e:
             print(f"Error verifying session: {e}")
             return False
@@ -73,7 +108,6 @@ class SessionService:
         """Save chat log to database"""
         try:
             chat_log_data = {
-                "id": str(uuid.uuid4()),
                 "session_id": session_id,
                 "prompt": prompt,
                 "response": response,
@@ -83,12 +117,34 @@ class SessionService:
             chat_response = supabase.table('chat_logs').insert(chat_log_data).execute()
             
             if chat_response.data:
-                return {"success": True, "chat_log_id": chat_log_data["id"]}
+                return {"success": True, "chat_log_id": chat_response.data[0]["id"]}
             else:
                 return {"success": False, "error": "Failed to save chat log"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def log_chat_if_session_valid(self, session_id: str, user_id: str, prompt: str, response: str) -> Dict[str, Any]:
+        """Verify the session and save a chat log in a single database round trip"""
+        try:
+            rpc_response = supabase.rpc('log_chat_if_session_valid', {
+                "p_session_id": session_id,
+                "p_user_id": user_id,
+                "p_prompt": prompt,
+                "p_response": response
+            }).execute()
+            
+            if rpc_response.data:
+                return {"success": True, "chat_log_id": rpc_response.data}
+            else:
+                return {"success": False, "session_found": False, "error": "Session not found or doesn't belong to user"}
+        except APIError as e:
+            # A session id that isn't a UUID can't match any session
+            if e.code == INVALID_ID_CODE:
+                return {"success": False, "session_found": False, "error": "Session not found or doesn't belong to user"}
+            return {"success": False, "session_found": True, "error": str(e)}
+        except Exception as e:
+            return {"success": False, "session_found": True, "error": str(e)}
+    
     def save_ai_response(self, session_id: str, response: str) -> Dict[str, Any]:
         """Save only AI response to chat log (when user prompt is already saved)"""
         return self.save_chat_log(session_id, "", response)
@@ -97,7 +153,7 @@ class SessionService:
         """Link a document to a session via document_sessions table"""
         try:
             # First check if the link already exists
-            existing_link = supabase.table('document_sessions').select("*").eq('document_id', document_id).eq('session_id', session_id).execute()
+            existing_link = supabase.table('document_sessions').select("id").eq('document_id', document_id).eq('session_id', session_id).execute()
             
             if existing_link.data:
                 return {"success": True, "link_created": False, "message": "Document already linked to session"}
@@ -191,6 +247,9 @@ class SessionService:
             session_response = supabase.table('sessions').delete().eq('id', session_id).eq('user_id', user_id).execute()
             
             if session_response.data is not None:  # None means successful deletion
+                self.invalidate_user_sessions(user_id)
+                with self._sessions_cache_lock:
+                    self._verified_cache.pop((session_id, user_id), None)
                 return {
                     "success": True,
                     "message": "Session deleted successfully",
@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from arq.connections import RedisSettings
+from src.core.config import settings
+from src.services.document_service import document_service
+from src.services.session_service import session_service
+from src.services.rag_pipeline.pipeline import rag_pipeline
+
+def process_document_background(file_path: str, user_id: str, doc_id: str, filename: str, upload_date: str, session_id: str):
+    """Background task to process the document"""
+    # Storage path mirrors the local upload layout
+    storage_path = f"{user_id}/{session_id}/{doc_id}_{filename}"
+    
+    try:
+        # Status is already "processing" - the upload handler set it before scheduling this job
+        # Check if RAG pipeline is initialized
+        if rag_pipeline is None:
+            document_service.update_document_status(doc_id, "failed", "RAG pipeline not initialized")
+            document_service.cleanup_local_file(file_path)
+            return
+        
+        print(f"Uploading to Supabase Storage: {storage_path}")
+        
+        # Storage upload and RAG ingest only read the local file, so overlap them
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            upload_future = executor.submit(document_service.upload_file_to_storage, file_path, storage_path)
+            
+            # Add to RAG system
+            result = rag_pipeline.add_document(
+                pdf_path=file_path,
+                user_id=user_id,
+                doc_id=doc_id,
+                filename=filename,
+                upload_date=upload_date
+            )
+            upload_successful = upload_future.result()
+        
+        if upload_successful:
+            if result["status"] == "success":
+                # Save document info to Supabase database
+                doc_data = {
+                    "id": doc_id,
+                    "filename": filename,
+                    "storage_path": storage_path,
+                    "upload_date": upload_date
+                }
+                
+                if document_service.save_document_to_supabase(doc_data):
+                    # Link document to session via document_sessions table
+                    print(f"Linking document {doc_id} to session {session_id}")
+                    session_service.link_document_to_session(doc_id, session_id)
+                    document_service.invalidate_user_documents(user_id)
+                    document_service.update_document_status(
+                        doc_id, 
+                        "completed", 
+                        "Document processed successfully", 
+                        result["chunks_added"]
+                    )
+                else:
+                    raise Exception("Failed to save document metadata to database")
+            else:
+                document_service.update_document_status(doc_id, "failed", result["message"])
+                # Clean up Supabase storage if processing failed
+                document_service.delete_from_storage(storage_path)
+        else:
+            if result["status"] == "success":
+                # Drop the chunks indexed while the upload was failing
+                rag_pipeline.delete_document(doc_id, user_id)
+            raise Exception("Failed to upload file to Supabase Storage")
+            
+        # Clean up local file after successful upload
+        document_service.cleanup_local_file(file_path)
+                
+    except Exception as e:
+        document_service.update_document_status(doc_id, "failed", f"Error processing document: {str(e)}")
+        # Clean up local file on error
+        document_service.cleanup_local_file(file_path)
+        # Clean up Supabase storage on error
+        document_service.delete_from_storage(storage_path)
+
+async def process_document(ctx, file_path: str, user_id: str, doc_id: str, filename: str, upload_date: str, session_id: str):
+    """ARQ job wrapper - runs the CPU-bound processing in a thread so the worker stays responsive"""
+    await asyncio.to_thread(
+        process_document_background,
+        file_path=file_path,
+        user_id=user_id,
+        doc_id=doc_id,
+        filename=filename,
+        upload_date=upload_date,
+        session_id=session_id
+    )
+
+class WorkerSettings:
+    """ARQ worker configuration - run with `arq src.worker.WorkerSettings`"""
+    functions = [process_document]
+    redis_settings = RedisSettings.from_dsn(settings.REDIS_URL or "redis://localhost:6379")
+    # Embedding is CPU-bound; scale by running more worker processes instead
+    max_jobs = 1
+    job_timeout = 600
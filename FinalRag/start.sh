@@ -2,4 +2,4 @@
 # Start script for Render
 
 echo "Starting RAG Document Processing API..."
-python -m uvicorn src.main:app --host 0.0.0.0 --port $PORT
+python -m uvicorn src.main:app --host 0.0.0.0 --port $PORT --loop uvloop --http httptools
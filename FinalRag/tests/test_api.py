@@ -1,10 +1,16 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 
 # API base URL
 BASE_URL = "http://localhost:8000"
 
+# Shared keep-alive session so every call reuses the same pooled connection
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+
 def test_create_session():
     """Test creating a new chat session"""
     url = f"{BASE_URL}/sessions"
@@ -13,7 +19,7 @@ def test_create_session():
         "user_id": "user123"
     }
     
-    response = requests.post(url, json=data)
+    response = SESSION.post(url, json=data)
     result = response.json()
     print("Create Session Response:", result)
     return result
@@ -30,7 +36,7 @@ def test_upload_document(session_id: str):
         "doc_id": "doc001"  # Optional
     }
     
-    response = requests.post(url, files=files, data=data)
+    response = SESSION.post(url, files=files, data=data)
     result = response.json()
     print("Upload Response:", result)
     
@@ -56,7 +62,7 @@ def test_query_with_session(session_id: str, doc_ids: list):
         "k": 4
     }
     
-    response = requests.post(url, json=data)
+    response = SESSION.post(url, json=data)
     result = response.json()
     print("Query Response:", result)
     return result
@@ -66,7 +72,7 @@ def test_get_chat_history(session_id: str):
     url = f"{BASE_URL}/sessions/{session_id}/chat-history"
     
     params = {"user_id": "user123"}
-    response = requests.get(url, params=params)
+    response = SESSION.get(url, params=params)
     result = response.json()
     print("Chat History Response:", result)
     return result
@@ -75,7 +81,7 @@ def test_get_user_sessions():
     """Test getting all sessions for a user"""
     url = f"{BASE_URL}/sessions/user123"
     
-    response = requests.get(url)
+    response = SESSION.get(url)
     result = response.json()
     print("User Sessions Response:", result)
     return result
@@ -85,7 +91,7 @@ def test_get_documents_for_session(session_id: str):
     url = f"{BASE_URL}/documents/user123"
     
     params = {"session_id": session_id}
-    response = requests.get(url, params=params)
+    response = SESSION.get(url, params=params)
     result = response.json()
     print("Session Documents Response:", result)
     return result
@@ -95,7 +101,7 @@ def wait_for_processing(user_id: str, doc_id: str, max_wait: int = 60):
     url = f"{BASE_URL}/documents/{user_id}/{doc_id}/status"
     
     for i in range(max_wait):
-        response = requests.get(url)
+        response = SESSION.get(url)
         if response.status_code == 200:
             status_info = response.json()
             print(f"Status check {i+1}: {status_info['status']} - {status_info['message']}")
@@ -116,7 +122,7 @@ def check_document_status(user_id: str, doc_id: str):
     """Check the status of a document"""
     url = f"{BASE_URL}/documents/{user_id}/{doc_id}/status"
     
-    response = requests.get(url)
+    response = SESSION.get(url)
     if response.status_code == 200:
         return response.json()
     else:
@@ -168,7 +174,7 @@ def test_get_documents():
     """Test getting user documents"""
     url = f"{BASE_URL}/documents/user123"
     
-    response = requests.get(url)
+    response = SESSION.get(url)
     print("Documents Response:", response.json())
     return response.json()
 
@@ -183,7 +189,7 @@ def test_query():
         "k": 4
     }
     
-    response = requests.post(url, json=data)
+    response = SESSION.post(url, json=data)
     print("Query Response:")
     result = response.json()
     
@@ -207,7 +213,7 @@ def test_query_debug():
         "k": 4
     }
     
-    response = requests.post(url, json=data)
+    response = SESSION.post(url, json=data)
     result = response.json()
     
     print("=== DEBUG QUERY RESPONSE ===")
@@ -225,7 +231,7 @@ def test_delete_document():
     """Test deleting a document"""
     url = f"{BASE_URL}/documents/user123/doc001"
     
-    response = requests.delete(url)
+    response = SESSION.delete(url)
     print("Delete Response:", response.json())
     return response.json()
 
@@ -0,0 +1,98 @@
+# Tests for the whitelisted formula evaluation in the function retrieval modules
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+RAG_PIPELINE_DIR = Path(__file__).resolve().parent.parent / "src" / "services" / "rag_pipeline"
+
+def load_module(name: str, filename: str):
+    """Load a pipeline module by path ('function_retrieval (1).py' isn't importable by name)"""
+    spec = importlib.util.spec_from_file_location(name, RAG_PIPELINE_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+function_retrieval = load_module("function_retrieval", "function_retrieval (1).py")
+fun_ret = load_module("fun_ret", "fun_ret.py")
+
+REJECTED_FORMULAS = [
+    "revenue.__class__",  # attribute access
+    "values[0]",  # subscript
+    "(lambda: revenue)()",  # lambda
+    "__import__('os')",  # call outside the whitelist
+    "open('secrets.txt')",
+    "getattr(revenue, 'real')",
+]
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    # The processor opens its SQLite file in the working directory
+    monkeypatch.chdir(tmp_path)
+    return function_retrieval.AgenticFormulaProcessor()
+
+# -----------------------------
+# function_retrieval (1).py
+# -----------------------------
+@pytest.mark.parametrize("formula", REJECTED_FORMULAS)
+def test_compile_rejects_non_arithmetic(formula):
+    with pytest.raises(ValueError):
+        function_retrieval._compile_formula(formula)
+
+def test_compile_rejects_keyword_arguments():
+    with pytest.raises(ValueError):
+        function_retrieval._compile_formula("sum(values, start=1)")
+
+@pytest.mark.parametrize("formula", ["revenue + True", "'a' * 3", "revenue + None"])
+def test_compile_rejects_bool_and_string_constants(formula):
+    with pytest.raises(ValueError, match="Unsupported constant"):
+        function_retrieval._compile_formula(formula)
+
+def test_evaluate_keeps_overlapping_names_apart(processor):
+    # str.replace substitution turned "taxes" into "<tax>es"
+    assert processor._evaluate_formula("taxes - tax", {"tax": 1, "taxes": 10}) == 9.0
+
+def test_evaluate_reduces_array_parameters(processor):
+    data_points = {"miscellaneous_income": [1, 2, 3]}
+    assert processor._evaluate_formula("sum(miscellaneous_income)", data_points) == 6.0
+    assert processor._evaluate_formula("avg(miscellaneous_income)", data_points) == 2.0
+
+def test_evaluate_rejects_formula_outside_whitelist(processor):
+    with pytest.raises(ValueError, match="Formula evaluation failed"):
+        processor._evaluate_formula("__import__('os').getcwd()", {})
+
+def test_missing_variable_returns_error_result(processor):
+    result = processor.process_request({
+        "function_name": "net_profit",
+        "formula": "revenue - expenses",
+        "data_points": {"revenue": 100}
+    })
+    assert result["status"] == "creation_error"
+    assert "expenses" in result["error"]
+
+# -----------------------------
+# fun_ret.py
+# -----------------------------
+@pytest.mark.parametrize("formula", REJECTED_FORMULAS + ["sum(values)"])
+def test_fun_ret_compile_rejects_non_arithmetic(formula):
+    # fun_ret formulas are plain arithmetic - no calls at all
+    with pytest.raises(ValueError):
+        fun_ret._compile_formula(formula)
+
+@pytest.mark.parametrize("formula", ["revenue + True", "'a' * 3"])
+def test_fun_ret_compile_rejects_bool_and_string_constants(formula):
+    with pytest.raises(ValueError, match="Unsupported constant"):
+        fun_ret._compile_formula(formula)
+
+def test_fun_ret_evaluate_keeps_overlapping_names_apart():
+    evaluator = fun_ret.SafeFormulaEvaluator({"tax": 1, "taxes": 10})
+    assert evaluator.evaluate("taxes - tax") == 9
+
+def test_fun_ret_missing_variable_returns_error_result(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = fun_ret.AgenticFormulaProcessor().process_request({
+        "function_name": "calculate_operating_cost",
+        "formula": "Operating Cost = Fixed Cost + Variable Cost - taxes",
+        "data_points": {"Fixed Cost": 100000, "taxes": 9000}
+    })
+    assert result == {"status": "exec_error", "error": "Unknown variable: variable_cost"}
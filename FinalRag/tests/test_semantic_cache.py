@@ -0,0 +1,187 @@
+# Tests for the semantic answer cache (hit, miss, threshold and invalidation)
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# settings.validate() runs on import; the cache never talks to these services
+for name in ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(name, "http://localhost" if name == "SUPABASE_URL" else "test")
+
+from src.core.config import settings
+from src.services import semantic_cache as semantic_cache_module
+from src.services.semantic_cache import SemanticCache
+
+DIM = 64
+USER_ID = "user123"
+DOC_IDS = ["doc-a", "doc-b"]
+
+rng = np.random.default_rng(42)
+BASE = rng.standard_normal(DIM)
+VECTORS = {
+    "What was revenue in 2023?": BASE,
+    # cosine ~0.995 with the base query
+    "What was the 2023 revenue?": BASE + 0.1 * rng.standard_normal(DIM),
+    "List the board members": rng.standard_normal(DIM),
+    # Near-identical embeddings that ask for a different figure
+    "What was revenue in 2022?": BASE + 0.01 * rng.standard_normal(DIM),
+}
+INCOME = rng.standard_normal(DIM)
+VECTORS["What was net income?"] = INCOME
+VECTORS["What was operating income?"] = INCOME + 0.01 * rng.standard_normal(DIM)
+
+class FakeRedis:
+    """The slice of redis.Redis the cache uses: MGET, and INCR/EXPIRE through a pipeline"""
+
+    def __init__(self):
+        self.values = {}
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def incr(self, key):
+        self.redis.values[key] = str(int(self.redis.values.get(key, 0)) + 1)
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        pass
+
+def make_cache():
+    return SemanticCache(lambda query: VECTORS[query].tolist())
+
+def make_result(query):
+    return {"status": "success", "original_query": query, "unscaled_response": "Revenue was $10M"}
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(semantic_cache_module, "redis_client", None)
+
+def test_exact_repeat_hits():
+    cache = make_cache()
+    query = "What was revenue in 2023?"
+    cache.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    assert cache.lookup(query, USER_ID, DOC_IDS, 4) == make_result(query)
+
+def test_paraphrase_hits_with_callers_query():
+    cache = make_cache()
+    cache.store("What was revenue in 2023?", USER_ID, DOC_IDS, 4, make_result("What was revenue in 2023?"))
+
+    result = cache.lookup("What was the 2023 revenue?", USER_ID, DOC_IDS, 4)
+
+    assert result is not None
+    assert result["unscaled_response"] == "Revenue was $10M"
+    assert result["original_query"] == "What was the 2023 revenue?"
+
+def test_unrelated_query_misses():
+    cache = make_cache()
+    cache.store("What was revenue in 2023?", USER_ID, DOC_IDS, 4, make_result("What was revenue in 2023?"))
+    assert cache.lookup("List the board members", USER_ID, DOC_IDS, 4) is None
+
+def test_queries_differing_only_by_year_miss_each_other():
+    cache = make_cache()
+    cache.store("What was revenue in 2023?", USER_ID, DOC_IDS, 4, make_result("What was revenue in 2023?"))
+    cache.store("What was revenue in 2022?", USER_ID, ["doc-c"], 4, make_result("What was revenue in 2022?"))
+
+    # cosine > 0.99, well above the threshold, but the years differ
+    assert cache.lookup("What was revenue in 2022?", USER_ID, DOC_IDS, 4) is None
+    assert cache.lookup("What was revenue in 2023?", USER_ID, ["doc-c"], 4) is None
+
+def test_queries_differing_by_metric_miss_each_other():
+    cache = make_cache()
+    cache.store("What was net income?", USER_ID, DOC_IDS, 4, make_result("What was net income?"))
+    assert cache.lookup("What was operating income?", USER_ID, DOC_IDS, 4) is None
+
+def test_different_document_set_user_or_k_misses():
+    cache = make_cache()
+    query = "What was revenue in 2023?"
+    cache.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    assert cache.lookup(query, USER_ID, ["doc-a"], 4) is None
+    assert cache.lookup(query, "someone-else", DOC_IDS, 4) is None
+    assert cache.lookup(query, USER_ID, DOC_IDS, 8) is None
+
+def test_document_order_does_not_matter():
+    cache = make_cache()
+    query = "What was revenue in 2023?"
+    cache.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    assert cache.lookup(query, USER_ID, list(reversed(DOC_IDS)), 4) is not None
+
+def test_similarity_below_threshold_misses(monkeypatch):
+    cache = make_cache()
+    cache.store("What was revenue in 2023?", USER_ID, DOC_IDS, 4, make_result("What was revenue in 2023?"))
+
+    # The paraphrase scores ~0.995 - above the default threshold, below this one
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.999)
+    assert cache.lookup("What was the 2023 revenue?", USER_ID, DOC_IDS, 4) is None
+
+def test_int8_scores_match_float_cosine():
+    # BGE-large dimension; quantizing both sides costs ~1e-3 of cosine at worst
+    vectors_rng = np.random.default_rng(7)
+    cache = make_cache()
+    stored = vectors_rng.standard_normal((64, 1024)).astype(np.float32)
+    stored /= np.linalg.norm(stored, axis=1, keepdims=True)
+    entries = []
+    for vector in stored:
+        embedding, scale = cache._quantize(vector)
+        assert embedding.dtype == np.int8
+        entries.append({"embedding": embedding, "scale": scale})
+    
+    for _ in range(20):
+        query = stored[0] + 0.3 * vectors_rng.standard_normal(1024).astype(np.float32)
+        query /= np.linalg.norm(query)
+        np.testing.assert_allclose(cache._scores(entries, query), stored @ query, atol=3e-3)
+
+def test_invalidate_document_drops_entries():
+    cache = make_cache()
+    query = "What was revenue in 2023?"
+    cache.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    cache.store(query, USER_ID, ["doc-c"], 4, make_result(query))
+
+    cache.invalidate_document("doc-b")
+
+    assert cache.lookup(query, USER_ID, DOC_IDS, 4) is None
+    assert cache.lookup("What was the 2023 revenue?", USER_ID, DOC_IDS, 4) is None
+    assert cache.lookup(query, USER_ID, ["doc-c"], 4) is not None
+
+def test_invalidate_document_reaches_other_workers(monkeypatch):
+    monkeypatch.setattr(semantic_cache_module, "redis_client", FakeRedis())
+    worker_a, worker_b = make_cache(), make_cache()
+    query = "What was revenue in 2023?"
+    worker_b.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    assert worker_b.lookup(query, USER_ID, DOC_IDS, 4) is not None
+
+    worker_a.invalidate_document("doc-a")
+
+    assert worker_b.lookup(query, USER_ID, DOC_IDS, 4) is None
+    assert worker_b.lookup("What was the 2023 revenue?", USER_ID, DOC_IDS, 4) is None
+    # Answers stored after the invalidation are served again
+    worker_b.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    assert worker_b.lookup(query, USER_ID, DOC_IDS, 4) is not None
+
+def test_unreadable_generations_skip_the_cache(monkeypatch):
+    class BrokenRedis(FakeRedis):
+        def mget(self, keys):
+            raise ConnectionError("redis down")
+
+    cache = make_cache()
+    query = "What was revenue in 2023?"
+    cache.store(query, USER_ID, DOC_IDS, 4, make_result(query))
+    monkeypatch.setattr(semantic_cache_module, "redis_client", BrokenRedis())
+    assert cache.lookup(query, USER_ID, DOC_IDS, 4) is None
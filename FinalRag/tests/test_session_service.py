@@ -0,0 +1,47 @@
+# Tests for saving chat logs through the log_chat_if_session_valid RPC
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+from postgrest.exceptions import APIError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# settings.validate() runs on import; every Supabase call below is patched
+for name in ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(name, "http://localhost" if name == "SUPABASE_URL" else "test")
+
+from src.services import session_service as session_service_module
+from src.services.session_service import session_service
+
+SESSION_ID = "3f2b6c1e-0000-4000-8000-000000000000"
+
+def patch_rpc(**execute):
+    supabase = mock.MagicMock()
+    supabase.rpc.return_value.execute = mock.MagicMock(**execute)
+    return mock.patch.object(session_service_module, "supabase", supabase)
+
+def test_saved_log_returns_its_id():
+    with patch_rpc(return_value=mock.Mock(data="log-id")):
+        result = session_service.log_chat_if_session_valid(SESSION_ID, "user123", "Q", "A")
+    assert result == {"success": True, "chat_log_id": "log-id"}
+
+def test_unknown_session_is_not_found():
+    with patch_rpc(return_value=mock.Mock(data=None)):
+        result = session_service.log_chat_if_session_valid(SESSION_ID, "user123", "Q", "A")
+    assert result["success"] is False
+    assert result["session_found"] is False
+
+def test_malformed_session_id_is_not_found():
+    # Postgres rejects the UUID cast with invalid_text_representation
+    error = APIError({"code": "22P02", "message": 'invalid input syntax for type uuid: "not-a-uuid"'})
+    with patch_rpc(side_effect=error):
+        result = session_service.log_chat_if_session_valid("not-a-uuid", "user123", "Q", "A")
+    assert result["success"] is False
+    assert result["session_found"] is False
+
+def test_database_errors_are_not_reported_as_missing_session():
+    with patch_rpc(side_effect=ConnectionError("supabase down")):
+        result = session_service.log_chat_if_session_valid(SESSION_ID, "user123", "Q", "A")
+    assert result["success"] is False
+    assert result["session_found"] is True
@@ -182,7 +182,6 @@ export default function ActivityLog({ currentSessionId, sessions = [], currentPr
      
       // Chat log
       case 'chat_log_pending': return <Database className={`${baseClasses} text-orange-500 ${statusClasses}`} />;
-      case 'chat_log_id': return <Hash className={`${baseClasses} text-green-500`} />;
      
       // Chunk details
       case 'chunk_detail_0':
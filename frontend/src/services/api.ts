@@ -101,8 +101,7 @@ interface QueryResponse {
     response: string;
     retrieved_metadata: any[];
     processed_docs: string[];
-    chat_log_id?: string;
-    warning?: string;
+    cache_hit?: boolean;
   };
   status: number;
   statusText: string;